@@ -0,0 +1,375 @@
+#-*- coding:utf-8 -*-
+# Stand-in for the xmmsclient python bindings, used by the benchmarks.
+#
+# Only the calls made by xmms2-OpenboxMenu.py are implemented. Every request
+# is answered in-process from a synthetic medialib. The environment selects
+# its size and the simulated latency of one round-trip:
+#
+#   FAKEXMMS_TRACKS    number of tracks in the medialib (default 1000)
+#   FAKEXMMS_PLAYLIST  number of entries in the active playlist (default 1000)
+#   FAKEXMMS_LATENCY   milliseconds per round-trip (default 0)
+#   FAKEXMMS_CONNECT_LATENCY  milliseconds connect() takes, like a hung daemon
+#                             answering the hello late (default 0)
+#   FAKEXMMS_CONFDIR   directory returned by userconfdir_get()
+
+import os
+import random
+import time
+
+import collections
+
+PLAYBACK_STATUS_STOP = 0
+PLAYBACK_STATUS_PLAY = 1
+PLAYBACK_STATUS_PAUSE = 2
+
+class XMMSError(Exception):
+    pass
+
+def userconfdir_get():
+    return os.getenv("FAKEXMMS_CONFDIR", "/tmp/fakexmms")
+
+#===============================================================================
+#Statistics
+# A round-trip is counted whenever the client waits for a request that was
+# sent after its last wait, requests sent together are answered together.
+statistics = {"requests": 0, "roundTrips": 0, "methods": dict(), "daemonTime": 0.0}
+answeredRequests = [0]
+
+def resetStatistics():
+    statistics["requests"] = 0
+    statistics["roundTrips"] = 0
+    statistics["methods"] = dict()
+    statistics["daemonTime"] = 0.0
+    answeredRequests[0] = 0
+
+#===============================================================================
+#Synthetic Medialib
+initials = (u"ABCDEFGHIJKLMNOPQRSTUVWXYZ" * 3 + u"abcdefghijklmnopqrstuvwxyz"
+            + u"0123456789" + u"ÄÉØÜ" + u"!(.")
+syllables = [u"ka", u"lo", u"mi", u"ne", u"ra", u"su", u"to", u"vi", u"ze", u"an",
+             u"el", u"or", u"ul", u"in", u"es", u"ba", u"do", u"fu", u"go", u"hy"]
+
+def randomWords(generator, count):
+    words = list()
+    for word in range(count):
+        length = generator.randint(1, 3)
+        words.append(u"".join(generator.choice(syllables) for syllable in range(length)))
+    return u" ".join(words)
+
+class SyntheticMedialib():
+    """Deterministic medialib, every artist has 4 albums of 10 tracks."""
+
+    tracksPerAlbum = 10
+    albumsPerArtist = 4
+    tracksPerArtist = tracksPerAlbum * albumsPerArtist
+
+    def __init__(self, count):
+        self.count = count
+
+        self.artists = list()
+        self.albums = list()
+        for artist in range((count + self.tracksPerArtist - 1) / self.tracksPerArtist):
+            generator = random.Random(artist)
+            initial = initials[generator.randrange(len(initials))]
+            self.artists.append(initial + randomWords(generator, 2))
+            self.albums.append([randomWords(generator, generator.randint(1, 4)).capitalize()
+                                for album in range(self.albumsPerArtist)])
+
+    def __contains__(self, id):
+        return 1 <= id <= self.count
+
+    def ids(self):
+        return range(1, self.count + 1)
+
+    def artistIds(self, artist):
+        first = artist * self.tracksPerArtist + 1
+        return range(first, min(first + self.tracksPerArtist, self.count + 1))
+
+    def albumIds(self, artist, album):
+        first = artist * self.tracksPerArtist + album * self.tracksPerAlbum + 1
+        return range(first, min(first + self.tracksPerAlbum, self.count + 1))
+
+    def get(self, id):
+        index = id - 1
+        artist, index = divmod(index, self.tracksPerArtist)
+        album, track = divmod(index, self.tracksPerAlbum)
+
+        return {"id": id,
+                "artist": self.artists[artist],
+                "album": self.albums[artist][album],
+                "title": u"Track {0} of {1}".format(track + 1, self.albums[artist][album]),
+                "tracknr": track + 1,
+                "date": unicode(1960 + (artist + album) % 60),
+                "duration": 120000 + (id * 7919) % 300000,
+                "size": 2000000 + (id * 104729) % 8000000,
+                "bitrate": 192000,
+                "lmod": 1300000000 + id,
+                "url": u"file:///music/{0:07d}.mp3".format(id)}
+
+    def getField(self, id, field):
+        if field == "id":
+            return id
+
+        index = id - 1
+        artist, index = divmod(index, self.tracksPerArtist)
+        if field == "artist":
+            return self.artists[artist]
+        if field == "album":
+            return self.albums[artist][index / self.tracksPerAlbum]
+        return self.get(id).get(field)
+
+def sortKey(row, order):
+    key = list()
+    for field in order:
+        value = row.get(field.lstrip('-'))
+        if value is None:
+            value = u""
+        key.append(value)
+    return key
+
+#===============================================================================
+#Daemon
+class Daemon():
+    """State shared by all connections of this process."""
+
+    def __init__(self):
+        trackCount = int(os.getenv("FAKEXMMS_TRACKS", "1000"))
+        playlistLength = int(os.getenv("FAKEXMMS_PLAYLIST", "1000"))
+
+        self.medialib = SyntheticMedialib(trackCount)
+        self.playlists = {"Default": [(position * 7) % trackCount + 1
+                                      for position in range(playlistLength)],
+                          "Party": range(1, min(trackCount, 100) + 1),
+                          "_active": []}
+        self.activePlaylist = "Default"
+        self.position = playlistLength / 2
+        self.status = PLAYBACK_STATUS_PLAY
+        self.volume = {"master": 45}
+
+        self.config = {"output.plugin": "alsa", "alsa.device": "default",
+                       "alsa.mixer": "PCM", "equalizer.enabled": "0",
+                       "equalizer.bands": "10", "equalizer.use_legacy": "0",
+                       "equalizer.extra_filtering": "1",
+                       "playlist.repeat_all": "0", "playlist.repeat_one": "0"}
+        for band in range(32):
+            self.config["equalizer.gain{0:02d}".format(band)] = "0"
+            self.config["equalizer.legacy{0}".format(band)] = "0"
+
+#===============================================================================
+#Clients
+class Result():
+    def __init__(self, value=None, error=None):
+        self.result = value
+        self.error = error
+        self.sequence = statistics["requests"]
+        self.answered = time.time() + float(os.getenv("FAKEXMMS_LATENCY", "0")) / 1000
+
+    def wait(self):
+        if self.sequence > answeredRequests[0]:
+            statistics["roundTrips"] += 1
+            answeredRequests[0] = statistics["requests"]
+
+        remaining = self.answered - time.time()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def iserror(self):
+        return self.error is not None
+
+    def get_error(self):
+        return self.error
+
+    def value(self):
+        return self.result
+
+class XMMS():
+    """Asynchronous client, every request is answered after the latency."""
+
+    def __init__(self, clientname=None):
+        self.requests = Requests()
+        self.callbacks = dict()
+
+    def connect(self, path=None):
+        time.sleep(float(os.getenv("FAKEXMMS_CONNECT_LATENCY", "0")) / 1000)
+        self.requests.daemon = Daemon()
+
+    def disconnect_callback_set(self, callback):
+        pass
+
+    # the menu server waits on this descriptor, the fake never sends broadcasts
+    # by itself, the callbacks are kept for tests to call
+    def get_fd(self):
+        if not hasattr(self, "pipe"):
+            self.pipe = os.pipe()
+        return self.pipe[0]
+
+    def want_ioout(self):
+        return False
+
+    def ioin(self):
+        pass
+
+    def ioout(self):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith("broadcast_"):
+            return lambda callback: self.callbacks.__setitem__(name, callback)
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        method = getattr(self.requests, name)
+
+        def call(*args, **kwargs):
+            statistics["requests"] += 1
+            statistics["methods"][name] = statistics["methods"].get(name, 0) + 1
+
+            start = time.time()
+            try:
+                return Result(method(*args, **kwargs))
+            except (KeyError, IndexError) as error:
+                return Result(error=str(error))
+            finally:
+                statistics["daemonTime"] += time.time() - start
+        return call
+
+class XMMSSync():
+    def __init__(self, clientname=None):
+        self.xmms = XMMS(clientname)
+
+    def connect(self, path=None):
+        self.xmms.connect(path)
+
+    def __getattr__(self, name):
+        method = getattr(self.xmms, name)
+
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            result.wait()
+            if result.iserror():
+                raise XMMSError(result.get_error())
+            return result.value()
+        return call
+
+class Requests():
+    """Implementation of the daemon requests."""
+
+    def __init__(self):
+        self.daemon = None
+
+    def activeEntries(self, playlist=None):
+        return self.daemon.playlists[playlist or self.daemon.activePlaylist]
+
+    def playback_status(self):
+        return self.daemon.status
+
+    def playback_start(self):
+        self.daemon.status = PLAYBACK_STATUS_PLAY
+
+    def playback_pause(self):
+        self.daemon.status = PLAYBACK_STATUS_PAUSE
+
+    def playback_tickle(self):
+        pass
+
+    def playback_current_id(self):
+        return self.activeEntries()[self.daemon.position]
+
+    def playback_volume_get(self):
+        return dict(self.daemon.volume)
+
+    def playback_volume_set(self, channel, volume):
+        self.daemon.volume[channel] = volume
+
+    def playlist_list(self):
+        return sorted(self.daemon.playlists)
+
+    def playlist_current_active(self):
+        return self.daemon.activePlaylist
+
+    def playlist_current_pos(self, playlist=None):
+        return {"position": self.daemon.position, "name": self.daemon.activePlaylist}
+
+    def playlist_list_entries(self, playlist=None):
+        return list(self.activeEntries(playlist))
+
+    def playlist_set_next(self, position):
+        self.daemon.position = position
+
+    def playlist_set_next_rel(self, offset):
+        self.daemon.position += offset
+
+    def playlist_load(self, playlist):
+        self.daemon.activePlaylist = playlist
+
+    def playlist_create(self, playlist):
+        self.daemon.playlists[playlist] = []
+
+    def playlist_remove(self, playlist):
+        del self.daemon.playlists[playlist]
+
+    def playlist_add_id(self, id, playlist=None):
+        self.activeEntries(playlist).append(id)
+
+    def playlist_insert_id(self, position, id, playlist=None):
+        self.activeEntries(playlist).insert(position, id)
+
+    def playlist_add_collection(self, collection, order=None, playlist=None):
+        self.activeEntries(playlist).extend(self.coll_query_ids(collection, order=order))
+
+    def playlist_move(self, position, newPosition, playlist=None):
+        entries = self.activeEntries(playlist)
+        entries.insert(newPosition, entries.pop(position))
+
+    def playlist_remove_entry(self, position, playlist=None):
+        del self.activeEntries(playlist)[position]
+
+    def medialib_get_info(self, id):
+        if id not in self.daemon.medialib:
+            raise KeyError("No such entry, {0}".format(id))
+        return self.daemon.medialib.get(id)
+
+    def coll_query_infos(self, collection, fields, start=0, leng=0, order=None, groupby=None):
+        medialib = self.daemon.medialib
+        ids = collection.evaluate(self.daemon)
+
+        rowFields = list(fields)
+        for field in (order or []) + (groupby or []):
+            if field.lstrip('-') not in rowFields:
+                rowFields.append(field.lstrip('-'))
+
+        rows = [dict((field, medialib.getField(id, field)) for field in rowFields)
+                for id in ids]
+
+        for field in reversed(order or []):
+            rows.sort(key=lambda row: sortKey(row, [field]), reverse=field.startswith('-'))
+
+        if groupby:
+            groups = set()
+            groupedRows = list()
+            for row in rows:
+                group = tuple(row.get(field) for field in groupby)
+                if group not in groups:
+                    groups.add(group)
+                    groupedRows.append(row)
+            rows = groupedRows
+
+        if leng:
+            rows = rows[start:start + leng]
+        else:
+            rows = rows[start:]
+
+        return [dict((field, row.get(field)) for field in fields) for row in rows]
+
+    def coll_query_ids(self, collection, start=0, leng=0, order=None):
+        rows = self.coll_query_infos(collection, ["id"], start, leng, order)
+        return [row["id"] for row in rows]
+
+    def config_list_values(self):
+        return dict(self.daemon.config)
+
+    def config_get_value(self, key):
+        return self.daemon.config[key]
+
+    def config_set_value(self, key, value):
+        self.daemon.config[key] = value
@@ -0,0 +1,110 @@
+#-*- coding:utf-8 -*-
+# Collection operators of the fake xmmsclient, evaluated against a Daemon.
+
+import fnmatch
+
+def matcher(value):
+    pattern = value
+    if not isinstance(pattern, unicode):
+        pattern = str(pattern).decode('utf8')
+    pattern = pattern.lower()
+
+    if not any(character in pattern for character in "*?["):
+        return lambda candidate: candidate.lower() == pattern
+    return lambda candidate: fnmatch.fnmatchcase(candidate.lower(), pattern)
+
+class Universe():
+    def evaluate(self, daemon):
+        return daemon.medialib.ids()
+
+class Reference():
+    def __init__(self, name, namespace="Collections"):
+        self.name = name
+        self.namespace = namespace
+
+    def evaluate(self, daemon):
+        if self.namespace != "Playlists":
+            raise KeyError("No such collection, {0}".format(self.name))
+        
+        # like a query of the daemon, an id in the playlist twice is listed once
+        seen = set()
+        ids = list()
+        for id in daemon.playlists[self.name]:
+            if id not in seen:
+                seen.add(id)
+                ids.append(id)
+        return ids
+
+class Match():
+    def __init__(self, parent=None, field=None, value=None):
+        self.parent = parent or Universe()
+        self.field = field
+        self.value = value
+
+    def evaluate(self, daemon):
+        medialib = daemon.medialib
+        matches = matcher(self.value)
+
+        # artists and albums are matched once per name, not once per track
+        if isinstance(self.parent, Universe) and self.field in ("artist", "album"):
+            results = list()
+            for artist, name in enumerate(medialib.artists):
+                if self.field == "artist":
+                    if matches(name):
+                        results.extend(medialib.artistIds(artist))
+                    continue
+                for album, albumName in enumerate(medialib.albums[artist]):
+                    if matches(albumName):
+                        results.extend(medialib.albumIds(artist, album))
+            return results
+
+        results = list()
+        for id in self.parent.evaluate(daemon):
+            value = medialib.getField(id, self.field)
+            if value is not None and matches(unicode(value)):
+                results.append(id)
+        return results
+
+class Has():
+    def __init__(self, parent=None, field=None):
+        self.parent = parent or Universe()
+        self.field = field
+
+    def coversAll(self):
+        # every synthetic track has an artist and an album
+        return isinstance(self.parent, Universe) and self.field in ("artist", "album")
+
+    def evaluate(self, daemon):
+        if self.coversAll():
+            return daemon.medialib.ids()
+        return [id for id in self.parent.evaluate(daemon)
+                if daemon.medialib.getField(id, self.field) is not None]
+
+class Intersection():
+    def __init__(self, *operands):
+        self.operands = list(operands)
+
+    def evaluate(self, daemon):
+        operands = [operand for operand in self.operands
+                    if not (isinstance(operand, Has) and operand.coversAll())] or self.operands[:1]
+        results = set(operands[0].evaluate(daemon))
+        for operand in operands[1:]:
+            results &= set(operand.evaluate(daemon))
+        return sorted(results)
+
+class Union():
+    def __init__(self, *operands):
+        self.operands = list(operands)
+
+    def evaluate(self, daemon):
+        results = set()
+        for operand in self.operands:
+            results |= set(operand.evaluate(daemon))
+        return sorted(results)
+
+class IDList():
+    def __init__(self):
+        self.ids = list()
+
+    def evaluate(self, daemon):
+        return [id for id in self.ids if id in daemon.medialib]
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Replays the menu requests against the fake daemon in benchmarks/fakexmms.
+#
+# Every menu is rendered in-process through dispatch(), the way a single
+# invocation or the menu server renders it. For every menu the daemon
+# requests, the round-trips, the size of the XML and its checksum are
+# printed, followed by the best wall time of the runs. With --counts-only
+# the timings are left out, so the output of two trees can be diffed.
+#
+# usage: menus.py [--counts-only] [--cache] [--tracks N] [--latency MS] [--runs N]
+#
+#   --tracks   size of the synthetic medialib, e.g. 1000, 100000 or 1000000
+#   --latency  simulated milliseconds per daemon round-trip
+#   --cache    put a medialib.db next to the fake config, so the local
+#              medialib index is used instead of daemon queries, the main
+#              menu is replayed once more after the medialib stamp changed
+
+import hashlib
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import time
+
+benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+repositoryDirectory = os.path.dirname(benchmarkDirectory)
+# written into every command of the XML in place of the absolute path of
+# the script, so the sizes and checksums do not depend on the checkout
+menuScript = "xmms2-OpenboxMenu.py"
+
+def readOptions(argv):
+    options = {"counts-only": False, "cache": False,
+               "tracks": 1000, "latency": 0.0, "runs": 5}
+    arguments = list(argv)
+    while arguments:
+        name = arguments.pop(0).lstrip("-")
+        if name not in options:
+            raise SystemExit("unknown option: " + name)
+        if isinstance(options[name], bool):
+            options[name] = True
+        else:
+            options[name] = type(options[name])(arguments.pop(0))
+    return options
+
+def touchMedialib():
+    """Changes the medialib stamp, the way the daemon does whenever a track starts."""
+    with open(os.path.join(os.environ["FAKEXMMS_CONFDIR"], "medialib.db"), "a") as database:
+        database.write("\0")
+
+def requests(fake, cache):
+    """Returns the menu arguments to replay, picked from the synthetic medialib.
+    
+    A third item is called before every replay of its menu, unmeasured.
+    """
+    synthetic = fake.SyntheticMedialib(int(os.environ["FAKEXMMS_TRACKS"]))
+    artist = synthetic.artists[0].encode('utf8')
+    album = synthetic.albums[0][0].encode('utf8')
+    position = int(os.environ["FAKEXMMS_PLAYLIST"]) / 2
+
+    replayed = [
+        ["MainMenu", []],
+        ["AlphabetIndex", ["menu", "index-alphabet"]],
+        ["ArtistsList", ["alphabetIndexArtists", menu.indexKey(artist)]],
+        ["AlbumList", ["indexAlbum", artist]],
+        ["TrackList", ["indexTracks", artist, album]],
+        ["SearchResults", ["searchResults", album[1:4]]],
+        ["TrackInfo", ["track", "info", "1"]],
+        ["TrackInfo prefetched", ["track", "info", "1", str(synthetic.get(1)["lmod"])]],
+        ["PlaylistEntriesMenu", ["menu", "playlist-entries", str(position), "both"]],
+        ["ConfigView", ["menu", "config-view"]],
+        ["ConfigView equalizer", ["menu", "config-view", "equalizer"]],
+    ]
+    if cache:
+        # menus which do not read the local index must not wait for its update
+        replayed.append(["MainMenu new stamp", [], touchMedialib])
+    return replayed
+
+def checkBatchEscaping():
+    """Checks that parameters made of "+" survive a written command line."""
+    import shlex
+    from xml.sax.saxutils import unescape
+    
+    def check(commandLine, commands):
+        argv = shlex.split(unescape(commandLine, {"&quot;": '"'}))
+        parsed = [command[1:] for command in menu.splitCommands(argv)]
+        if parsed != commands or not menu.isActionCommand(argv):
+            raise SystemExit("batch escaping broken: " + commandLine)
+    
+    commands = [["loadPlaylist", "+"], ["jump", "3", "Ed Sheeran", "++"],
+                ["album", "add", "Ed Sheeran", "+"]]
+    check(menu.createCommand(menu.batchCommand(*commands)), commands)
+    
+    # the artist and album recorded for the Recent and Top albums menus
+    check(menu.commandTemplate("track", "add").command("3", "+", "+++"),
+          [["track", "add", "3", "+", "+++"]])
+    check(menu.commandTemplate("playlist-entry", "move").command(
+              "7", "0", menu.batchSeparator, "jump", "0", "Ed Sheeran", "+",
+              menu.batchSeparator, "play"),
+          [["playlist-entry", "move", "7", "0"], ["jump", "0", "Ed Sheeran", "+"], ["play"]])
+
+def replay(arguments):
+    """Renders the menu as a fresh invocation, returns the XML and the elapsed time."""
+    menu.playerState.clear()
+    menu.cachedValues.clear()
+    menu.medialib = None
+
+    output = StringIO.StringIO()
+    stdout = sys.stdout
+    sys.stdout = output
+    try:
+        start = time.time()
+        menu.dispatch([menuScript] + arguments)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout = stdout
+
+    return output.getvalue(), elapsed
+
+if __name__ == "__main__":
+    options = readOptions(sys.argv[1:])
+
+    workDirectory = tempfile.mkdtemp(prefix="xmms2-OpenboxMenu-")
+    os.environ["FAKEXMMS_CONFDIR"] = workDirectory
+    os.environ["FAKEXMMS_TRACKS"] = str(options["tracks"])
+    os.environ.setdefault("FAKEXMMS_PLAYLIST", "1000")
+    os.environ["FAKEXMMS_LATENCY"] = str(options["latency"])
+    if options["cache"]:
+        open(os.path.join(workDirectory, "medialib.db"), "w").close()
+
+    sys.path.insert(0, os.path.join(benchmarkDirectory, "fakexmms"))
+    import xmmsclient as fake
+
+    sys.path.insert(0, repositoryDirectory)
+    import openboxMenu as menu
+    menu.menuScript = menuScript
+    menu.importMenuModules()
+    menu.xmms = menu.connect()
+
+    # the local index is built once, outside of the measured requests
+    menu.openMedialib()
+    
+    checkBatchEscaping()
+
+    header = "{0:<22} {1:>8} {2:>8} {3:>9} {4:>8}".format("menu", "requests",
+                                                          "trips", "bytes", "md5")
+    if not options["counts-only"]:
+        header += " {0:>10}".format("best ms")
+    print(header)
+
+    try:
+        for replayed in requests(fake, options["cache"]):
+            name, arguments = replayed[:2]
+            timings = list()
+            for run in range(options["runs"]):
+                if len(replayed) > 2:
+                    replayed[2]()
+                fake.resetStatistics()
+                xml, elapsed = replay(arguments)
+                timings.append(elapsed)
+                if run == 0:
+                    counts = dict(fake.statistics)
+
+            line = "{0:<22} {1:>8} {2:>8} {3:>9} {4:>8}".format(
+                name, counts["requests"], counts["roundTrips"], len(xml),
+                hashlib.md5(xml).hexdigest()[:8])
+            if not options["counts-only"]:
+                line += " {0:>10.1f}".format(min(timings) * 1000)
+            print(line)
+    finally:
+        shutil.rmtree(workDirectory)
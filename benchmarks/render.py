@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Measures how long the writers take to render a large menu into a pipe.
+#
+# A menu of TrackList-like entries is written through Container once with
+# a flush after every line, the way the former print() based writers reached
+# the pipe, and once with the default MenuOutput chunk size.
+#
+# usage: render.py [entries] [runs]
+
+import os
+import sys
+import threading
+import time
+
+benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+repositoryDirectory = os.path.dirname(benchmarkDirectory)
+
+sys.path.insert(0, os.path.join(benchmarkDirectory, "fakexmms"))
+sys.path.insert(0, repositoryDirectory)
+import openboxMenu as menu
+menu.importMenuModules()
+
+def createEntries(count):
+    entries = list()
+    for id in range(count):
+        addToCurrentPlaylist = menu.Button("Add to Playlist", ["track", "add", str(id)])
+        trackInfo = menu.PipeMenu("Infos", ["track", "info", str(id)])
+        entries.append(menu.Menu("xmms-track-" + str(id), "{0} - Track {0}".format(id),
+                                 [addToCurrentPlaylist, trackInfo]))
+    return entries
+
+def drain(descriptor):
+    while os.read(descriptor, 65536):
+        pass
+
+def render(entries, chunkSize):
+    readDescriptor, writeDescriptor = os.pipe()
+    reader = threading.Thread(target=drain, args=[readDescriptor])
+    reader.start()
+    
+    stream = os.fdopen(writeDescriptor, "w", 0)
+    menu.MenuOutput.chunkSize = chunkSize
+    try:
+        start = time.time()
+        menu.Container(entries).write(stream)
+        elapsed = time.time() - start
+    finally:
+        stream.close()
+    
+    reader.join()
+    os.close(readDescriptor)
+    return elapsed
+
+if __name__ == "__main__":
+    count = 10000
+    runs = 5
+    if len(sys.argv) >= 2:
+        count = int(sys.argv[1])
+    if len(sys.argv) >= 3:
+        runs = int(sys.argv[2])
+    
+    entries = createEntries(count)
+    
+    print("{0:<20} {1:>10}".format("output", "best ms"))
+    for name, chunkSize in [("flush per line", 1), ("chunked", 65536)]:
+        best = min(render(entries, chunkSize) for run in range(runs))
+        print("{0:<20} {1:>10.1f}".format(name, best * 1000))
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Measures the render cost per row of large list menus.
+#
+# The menus are rendered in-process against the fake daemon in
+# benchmarks/fakexmms, with a playlist and a page size of the given number of
+# rows. The time the fake daemon spends answering is left out, what remains
+# is the cost of building labels and commands and writing the XML.
+#
+# usage: rows.py [rows] [runs]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+repositoryDirectory = os.path.dirname(benchmarkDirectory)
+
+class NullStream():
+    def write(self, data):
+        pass
+
+def measure(entries, runs):
+    best = None
+    for run in range(runs):
+        menu.playerState.clear()
+        fake.resetStatistics()
+
+        start = time.time()
+        menu.Container(entries()).write(NullStream())
+        elapsed = time.time() - start - fake.statistics["daemonTime"]
+
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+if __name__ == "__main__":
+    rows = 10000
+    runs = 5
+    if len(sys.argv) >= 2:
+        rows = int(sys.argv[1])
+    if len(sys.argv) >= 3:
+        runs = int(sys.argv[2])
+
+    workDirectory = tempfile.mkdtemp(prefix="xmms2-OpenboxMenu-")
+    os.environ["FAKEXMMS_CONFDIR"] = workDirectory
+    os.environ["FAKEXMMS_TRACKS"] = str(rows * 4)
+    os.environ["FAKEXMMS_PLAYLIST"] = str(rows)
+
+    try:
+        sys.path.insert(0, os.path.join(benchmarkDirectory, "fakexmms"))
+        import xmmsclient as fake
+
+        sys.path.insert(0, repositoryDirectory)
+        import openboxMenu as menu
+        menu.importMenuModules()
+        menu.xmms = menu.connect()
+        menu.medialib = menu.openMedialib()
+
+        menus = [
+            ("PlaylistEntriesMenu", lambda: menu.PlaylistEntriesMenu(0, "top", rows)),
+            ("SearchResults", lambda: menu.SearchResults("a", 0, rows)),
+        ]
+
+        menu.searchResultLimit = rows
+
+        print("{0:<22} {1:>10} {2:>12}".format("menu", "best ms", "us per row"))
+        for name, entries in menus:
+            best = measure(entries, runs)
+            print("{0:<22} {1:>10.1f} {2:>12.1f}".format(name, best * 1000, best * 1e6 / rows))
+    finally:
+        shutil.rmtree(workDirectory)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Measures the wall time of single xmms2-OpenboxMenu.py invocations.
+#
+# Every command is started as a new process, the way Openbox runs it, against
+# the stub xmmsclient module in benchmarks/fakexmms. XMMS_PATH points to a
+# listening dummy socket, so the check whether xmms2d is running passes.
+#
+# usage: startup.py [runs]
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+benchmarkDirectory = os.path.dirname(os.path.abspath(__file__))
+menuScript = os.path.join(os.path.dirname(benchmarkDirectory), "xmms2-OpenboxMenu.py")
+
+commands = [
+    [],
+    ["play"],
+    ["next"],
+    ["volume", "50"],
+    ["jump", "3"],
+    ["menu", "volume"],
+    ["menu", "index-alphabet"],
+    ["track", "info", "1"],
+]
+
+def measure(command, runs, environment):
+    timings = list()
+    with open(os.devnull, "w") as devnull:
+        for run in range(runs):
+            start = time.time()
+            subprocess.check_call([sys.executable, menuScript] + command,
+                                  stdout=devnull, env=environment)
+            timings.append(time.time() - start)
+    
+    timings.sort()
+    return timings[len(timings) / 2], timings[0]
+
+if __name__ == "__main__":
+    runs = 20
+    if len(sys.argv) == 2:
+        runs = int(sys.argv[1])
+    
+    workDirectory = tempfile.mkdtemp(prefix="xmms2-OpenboxMenu-")
+    
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.path.join(benchmarkDirectory, "fakexmms")
+    environment["FAKEXMMS_CONFDIR"] = workDirectory
+    environment["XDG_RUNTIME_DIR"] = workDirectory
+    
+    daemonAddress = os.path.join(workDirectory, "xmms-ipc")
+    daemon = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        daemon.bind(daemonAddress)
+        daemon.listen(128)
+        environment["XMMS_PATH"] = "unix://" + daemonAddress
+        
+        print("{0:<30} {1:>10} {2:>10}".format("command", "median ms", "min ms"))
+        for command in commands:
+            median, minimum = measure(command, runs, environment)
+            print("{0:<30} {1:>10.1f} {2:>10.1f}".format(" ".join(command) or "(main menu)",
+                                                         median * 1000, minimum * 1000))
+    finally:
+        daemon.close()
+        shutil.rmtree(workDirectory)
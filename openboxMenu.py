@@ -0,0 +1,2906 @@
+#-*- coding:utf-8 -*-
+
+# Copyright (c) 2012 Eli
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction, 
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+#===============================================================================
+#Openbox menu writers
+
+def marker(isMarked):
+    if isMarked is None:
+        return ""
+    if isMarked:
+        return "=> "
+    else:
+        return ".     "
+
+class MenuOutput():
+    """Collects the XML of a menu and writes it to the stream in large chunks."""
+    
+    chunkSize = 65536
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.chunks = list()
+        self.size = 0
+        self.start = time.time()
+    
+    def write(self, text):
+        self.chunks.append(text)
+        self.size += len(text)
+        if self.size >= self.chunkSize:
+            self.flush()
+    
+    def flush(self):
+        self.stream.write("".join(self.chunks))
+        self.chunks = list()
+        self.size = 0
+
+class Label(object):
+    __slots__ = ("label", "isMarked")
+    
+    def __init__(self, label, isMarked=None):
+        self.label = label
+        self.isMarked = isMarked
+    
+    def write(self, output):
+        formattedLabel = quoteattr(marker(self.isMarked) + self.label)
+        
+        output.write("<item label={0}>\n</item>\n".format(formattedLabel))
+
+def writeButton(output, label, commands, isMarked=None):
+    formattedLabel = marker(isMarked) + label
+    formattedLabel = quoteattr(formattedLabel)
+    
+    writeCommandButton(output, formattedLabel, createCommand(commands))
+
+def writeCommandButton(output, formattedLabel, command):
+    """Writes a button from its quoted label and complete command line."""
+    output.write("<item label={0}>\n"
+                 " <action name=\"Execute\">\n"
+                 "  <execute>{1}</execute>\n"
+                 " </action>\n"
+                 "</item>\n".format(formattedLabel, command))
+
+def writePipeMenu(output, label, commands, isMarked=None):
+    formattedLabel = quoteattr(marker(isMarked) + label)
+
+    writeCommandPipeMenu(output, formattedLabel, createCommand(commands))
+
+def writeCommandPipeMenu(output, formattedLabel, command):
+    """Writes a pipe menu from its quoted label and complete command line."""
+    output.write("<menu execute={0} id={0} label={1}/>\n".format(quoteattr(command),
+                                                                formattedLabel))
+
+class Button(object):
+    __slots__ = ("label", "commands", "isMarked")
+    
+    def __init__(self, label, commands, isMarked=None):
+        self.label = label
+        self.commands = commands
+        self.isMarked = isMarked
+    
+    def write(self, output):
+        writeButton(output, self.label, self.commands, self.isMarked)
+
+class Menu(object):
+    __slots__ = ("id", "label", "entries", "isMarked")
+    
+    def __init__(self, id, label, entries=None, isMarked=None):
+        self.id = id
+        self.label = label
+        self.entries = entries
+        self.isMarked = isMarked
+        
+    def write(self, output):
+        formattedMarker = marker(self.isMarked) + self.label
+        output.write("<menu id={0} label={1}>\n".format(quoteattr(self.id),
+                                                       quoteattr(formattedMarker)))
+        
+        for entry in self.entries:
+            if entry is not None:
+                entry.write(output)
+
+        output.write("</menu>\n")
+
+class PipeMenu(object):
+    __slots__ = ("label", "commands", "isMarked")
+    
+    def __init__(self, label, commands, isMarked=None):
+        self.label = label
+        self.commands = commands
+        self.isMarked = isMarked
+    
+    def write(self, output):
+        writePipeMenu(output, self.label, self.commands, self.isMarked)
+
+class TrackMenu(object):
+    """Menu of a medialib track, written without creating its entries."""
+    
+    __slots__ = ("menuId", "trackId", "label", "lmod", "artist", "album")
+    
+    def __init__(self, menuId, trackId, label, lmod=None, artist="", album=""):
+        self.menuId = menuId
+        self.trackId = trackId
+        self.label = label
+        self.lmod = lmod
+        self.artist = artist
+        self.album = album
+    
+    def write(self, output):
+        output.write("<menu id={0} label={1}>\n".format(quoteattr(self.menuId),
+                                                       quoteattr(self.label)))
+        writeCommandButton(output, quoteParameter("Add to Playlist"),
+                           commandTemplate("track", "add").command(self.trackId, self.artist,
+                                                                   self.album))
+        writeCommandPipeMenu(output, quoteParameter("Infos"),
+                             commandTemplate("track", "info").command(*infoParameters(self.trackId,
+                                                                                      self.lmod)))
+        output.write("</menu>\n")
+
+class Separator(object):
+    __slots__ = ("label",)
+    
+    def __init__(self, label=None):
+        self.label = label
+    
+    def write(self, output):
+        if self.label is None:
+            output.write("<separator/>\n")
+        else:
+            output.write("<separator label={0}/>\n".format(quoteattr(self.label)))
+
+class Container():
+    def __init__(self, entries):
+        self.entries = entries
+        
+    def write(self, stream=None):
+        output = MenuOutput(stream or sys.stdout)
+        
+        output.write("<?xml version=\"1.0\" encoding=\"utf-8\"?>\n")
+        output.write("<openbox_pipe_menu>\n")
+
+        if isinstance(self.entries, list):
+            for entry in self.entries:
+                if entry is not None:
+                    entry.write(output)
+        else:
+            self.entries.write(output)
+
+        output.write("</openbox_pipe_menu>\n")
+        output.flush()
+        
+        if profiler is not None:
+            profiler.recordRender(output.start)
+
+#===============================================================================
+#Imports
+
+import os
+import sys
+
+import json
+import re
+import socket
+import time
+
+from openboxMenuClient import (argvServerFlag, argvProfileFlag, argvProfileSummaryFlag,
+                               argvBatchSeparator, promptCommands, runtimePath, serverAddress)
+
+# the script the written commands run, main() sets the one that was started
+menuScript = os.path.join(os.path.dirname(__file__), "xmms2-OpenboxMenu.py")
+
+def importMenuModules():
+    """Imports the modules only needed to write menus."""
+    global escape, unescape, quoteattr, sqlite3
+    
+    from xml.sax.saxutils import escape, unescape, quoteattr
+    import sqlite3
+
+try:
+    import xmmsclient
+    from xmmsclient import collections as xc
+except ImportError as error:
+    importMenuModules()
+    Container([Separator("Failed to load required modules!"), Separator(str(error)) ]).write()
+    sys.exit(1)
+
+#===============================================================================
+#Connection
+def resultValue(result):
+    result.wait()
+    if result.iserror():
+        raise xmmsclient.XMMSError(result.get_error())
+    return result.value()
+
+class Connection(object):
+    """Synchronous interface to an asynchronous xmmsclient.XMMS connection.
+    
+    Method calls wait for their result like with xmmsclient.XMMSSync, but
+    gather() sends several requests before waiting for the first answer and
+    send() does not wait at all, its result is checked by flush().
+    """
+    
+    def __init__(self, clientName):
+        self.xmms = xmmsclient.XMMS(clientName)
+        self.isConnected = False
+        self.pending = list()
+    
+    def connect(self, path=None):
+        self.xmms.connect(path)
+        self.xmms.disconnect_callback_set(self.disconnected)
+        self.isConnected = True
+    
+    def disconnected(self, *args):
+        self.isConnected = False
+    
+    def fileno(self):
+        return self.xmms.get_fd()
+    
+    def wantsOutput(self):
+        return self.xmms.want_ioout()
+    
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        
+        method = getattr(self.xmms, name)
+        
+        def call(*args, **kwargs):
+            if profiler is None:
+                return resultValue(method(*args, **kwargs))
+            
+            start = time.time()
+            value = resultValue(method(*args, **kwargs))
+            profiler.recordCall(name, args, value, start)
+            return value
+        return call
+    
+    def gather(self, *requests):
+        start = time.time()
+        results = [getattr(self.xmms, name)(*args) for name, args in requests]
+        values = [resultValue(result) for result in results]
+        
+        if profiler is not None:
+            for (name, args), value in zip(requests, values):
+                profiler.recordCall(name, args, value, start)
+        return values
+    
+    def send(self, name, *args):
+        self.pending.append((name, args, time.time(), getattr(self.xmms, name)(*args)))
+    
+    def flush(self):
+        """Waits for the results of the sent requests, raises the first error."""
+        pending = self.pending
+        self.pending = list()
+        
+        for name, args, start, result in pending:
+            value = resultValue(result)
+            if profiler is not None:
+                profiler.recordCall(name, args, value, start)
+
+#===============================================================================
+#Daemon Probe
+def defaultDaemonPath():
+    import getpass
+    return "unix:///tmp/xmms-ipc-" + getpass.getuser()
+
+def daemonPath():
+    return os.getenv("XMMS_PATH") or defaultDaemonPath()
+
+def daemonSignature(path):
+    """Returns what identifies the running daemon, None if its socket is missing."""
+    if not path.startswith("unix://"):
+        return path
+    try:
+        status = os.stat(path[len("unix://"):])
+    except OSError:
+        return None
+    return "{0} {1} {2}".format(path, status.st_ino, status.st_ctime)
+
+def probeConnect(path):
+    """Opens and closes a plain socket to the daemon, within connectTimeout seconds."""
+    if path.startswith("unix://"):
+        family, address = socket.AF_UNIX, path[len("unix://"):]
+    elif path.startswith("tcp://"):
+        host, _, port = path[len("tcp://"):].rpartition(":")
+        family, address = socket.AF_INET, (host.strip("[]"), int(port or 9667))
+    else:
+        return
+    
+    probe = socket.socket(family, socket.SOCK_STREAM)
+    probe.settimeout(connectTimeout)
+    try:
+        probe.connect(address)
+    finally:
+        probe.close()
+
+def readDaemonStatus():
+    """Returns the time, daemon signature and error of the last probe, None if unknown."""
+    try:
+        with open(runtimePath("status")) as statusFile:
+            checked, signature, error = json.load(statusFile)
+    except (IOError, ValueError, TypeError):
+        return None
+    return checked, signature, error
+
+def probeDaemon():
+    """Raises IOError without waiting long if the daemon is not reachable.
+    
+    The outcome is kept in a status file for daemonStatusMaxAge seconds, as
+    long as the daemon socket is the same, so a stopped daemon costs a stat
+    per menu instead of a connect attempt.
+    """
+    path = daemonPath()
+    signature = daemonSignature(path)
+    if signature is None:
+        raise IOError("xmms2d is not running")
+    
+    status = readDaemonStatus()
+    if status is not None:
+        checked, checkedSignature, error = status
+        if checkedSignature == signature and 0 <= time.time() - checked < daemonStatusMaxAge:
+            if error is not None:
+                raise IOError(error)
+            return
+    
+    error = None
+    try:
+        probeConnect(path)
+    except socket.timeout:
+        error = "xmms2d did not answer within {0}s".format(connectTimeout)
+    except (socket.error, ValueError) as failure:
+        error = "xmms2d is not reachable, " + str(failure)
+    
+    saveDaemonStatus(signature, error)
+    if error is not None:
+        raise IOError(error)
+
+def saveDaemonStatus(signature, error):
+    try:
+        with ReplacedFile(runtimePath("status")) as statusFile:
+            json.dump([time.time(), signature, error], statusFile)
+    except EnvironmentError:
+        pass
+
+def gather(*requests):
+    """Runs (method name, arguments) requests, concurrently if the connection can."""
+    if hasattr(xmms, "gather"):
+        return xmms.gather(*requests)
+    return [getattr(xmms, name)(*args) for name, args in requests]
+
+def send(name, *args):
+    """Runs a request whose result is not needed, without waiting if the connection can."""
+    if hasattr(xmms, "send"):
+        xmms.send(name, *args)
+    else:
+        getattr(xmms, name)(*args)
+
+def flush():
+    if hasattr(xmms, "flush"):
+        xmms.flush()
+
+#===============================================================================
+#Player State
+class PlayerState():
+    """Last known values of argument-less daemon calls.
+    
+    The menu server keeps the values current through daemon broadcasts.
+    Values older than stateMaxAge seconds are stale and get fetched again.
+    """
+    
+    def __init__(self):
+        self.values = dict()
+        self.times = dict()
+        self.signatures = dict()
+    
+    def set(self, name, value):
+        self.values[name] = value
+        self.times[name] = time.time()
+    
+    def invalidate(self, *names):
+        for name in names:
+            self.values.pop(name, None)
+            self.times.pop(name, None)
+            self.signatures.pop(name, None)
+    
+    def clear(self):
+        self.invalidate(*list(self.values))
+    
+    def age(self, name):
+        """Returns the seconds since a value was received, None if it is unknown."""
+        if name not in self.times:
+            return None
+        return time.time() - self.times[name]
+    
+    def isFresh(self, name):
+        age = self.age(name)
+        return age is not None and age <= stateMaxAge
+    
+    def get(self, name):
+        return self.values[name]
+    
+    def signature(self, name):
+        """Returns a hash of a list value, computed once for every value received."""
+        value = self.values[name]
+        signature = self.signatures.get(name)
+        if signature is None or signature[0] is not value:
+            signature = self.signatures[name] = (value, hash(tuple(value)))
+        return signature[1]
+    
+    def updater(self, name):
+        def update(result):
+            if not result.iserror():
+                self.set(name, result.value())
+            return True
+        return update
+    
+    def invalidator(self, *names):
+        def invalidate(result):
+            self.invalidate(*names)
+            return True
+        return invalidate
+    
+    def volumeChanged(self, result):
+        if not result.iserror() and self.isFresh("playback_volume_get"):
+            volumes = dict(self.get("playback_volume_get"))
+            volumes.update(result.value())
+            self.set("playback_volume_get", volumes)
+        else:
+            self.invalidate("playback_volume_get")
+        return True
+    
+    def playlistLoaded(self, result):
+        self.invalidate("playlist_list_entries", "playlist_current_pos")
+        if not result.iserror():
+            self.set("playlist_current_active", result.value())
+        return True
+    
+    def subscribe(self, connection):
+        """Keeps the values current with the broadcasts of a connection."""
+        self.clear()
+        
+        client = connection.xmms
+        client.broadcast_playback_status(self.updater("playback_status"))
+        client.broadcast_playback_current_id(self.updater("playback_current_id"))
+        client.broadcast_playback_volume_changed(self.volumeChanged)
+        client.broadcast_playlist_current_pos(self.updater("playlist_current_pos"))
+        client.broadcast_playlist_loaded(self.playlistLoaded)
+        client.broadcast_playlist_changed(self.invalidator("playlist_list_entries",
+                                                           "playlist_current_pos"))
+        client.broadcast_collection_changed(self.invalidator("playlist_list"))
+
+playerState = PlayerState()
+
+def currentPosition():
+    """Returns the position of the current entry in the active playlist, or None."""
+    try:
+        position = fetchState("playlist_current_pos")["playlist_current_pos"]
+    except xmmsclient.XMMSError:
+        return None
+    
+    if isinstance(position, dict):
+        position = position.get("position")
+    if position is None or position < 0:
+        return None
+    return position
+
+def playlistWindow(start, end=None):
+    """Returns the ids of the active playlist's entries from start to end.
+    
+    The entries come from playlist_list_entries, a query of the playlist
+    collection would list an id only once even if it is in the playlist
+    twice. The menu server keeps the list until the playlist changes.
+    Without end, all entries from start on are returned.
+    """
+    return fetchState("playlist_list_entries")["playlist_list_entries"][start:end]
+
+def fetchState(*names):
+    """Returns the values of argument-less daemon calls.
+    
+    Fresh values come from the player state, the others are fetched together
+    in one round-trip.
+    """
+    missing = [name for name in names if not playerState.isFresh(name)]
+    for name, value in zip(missing, gather(*[(name, []) for name in missing])):
+        playerState.set(name, value)
+    
+    return dict((name, playerState.get(name)) for name in names)
+
+#===============================================================================
+#Profiling
+profiler = None
+
+def commandName(argv):
+    if len(argv) == 1:
+        return "main"
+    if argv[1] in ["menu", "track", "album", "artist", "letter", "playlist-entry"] and len(argv) > 2:
+        return argv[1] + " " + argv[2]
+    return argv[1]
+
+def profileLogPath():
+    return os.path.join(clientDirectory(), "profile.log")
+
+class Profiler():
+    """Timings of one menu request, appended as a JSON line to the profile log."""
+    
+    def __init__(self, argv, start=None):
+        self.argv = argv
+        self.start = start or time.time()
+        self.calls = list()
+        self.render = 0.0
+    
+    def recordCall(self, name, args, result, start):
+        resultCount = 1
+        if isinstance(result, (list, dict)):
+            resultCount = len(result)
+        
+        self.calls.append({"method": name,
+                           "argsSize": len(repr(args)),
+                           "resultCount": resultCount,
+                           "ms": (time.time() - start) * 1000})
+    
+    def recordRender(self, start):
+        self.render += (time.time() - start) * 1000
+    
+    def save(self):
+        record = {"command": commandName(self.argv),
+                  "argv": self.argv[1:],
+                  "time": self.start,
+                  "totalMs": (time.time() - self.start) * 1000,
+                  "renderMs": self.render,
+                  "calls": self.calls}
+        
+        directory = clientDirectory()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(profileLogPath(), "a") as log:
+            log.write(json.dumps(record) + "\n")
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+def printProfileSummary():
+    """Prints the p50/p95 timings of every menu command in the profile log."""
+    records = dict()
+    try:
+        with open(profileLogPath()) as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records.setdefault(record["command"], list()).append(record)
+    except IOError:
+        print("No profiled runs yet, run the menu with " + argvProfileFlag + " first")
+        return
+    
+    columns = "{0:<28} {1:>6} {2:>9} {3:>9} {4:>10} {5:>10} {6:>7}"
+    print(columns.format("command", "runs", "p50 ms", "p95 ms",
+                         "daemon p50", "render p50", "calls"))
+    
+    for command in sorted(records):
+        runs = records[command]
+        totals = [record["totalMs"] for record in runs]
+        daemonTimes = [sum(call["ms"] for call in record["calls"]) for record in runs]
+        renderTimes = [record["renderMs"] for record in runs]
+        callCounts = [len(record["calls"]) for record in runs]
+        
+        print(columns.format(command, len(runs),
+                             "%.1f" % percentile(totals, 0.5),
+                             "%.1f" % percentile(totals, 0.95),
+                             "%.1f" % percentile(daemonTimes, 0.5),
+                             "%.1f" % percentile(renderTimes, 0.5),
+                             percentile(callCounts, 0.5)))
+
+#===============================================================================
+#Settings
+# defaults, menuSettings.ini in the client directory overrides them
+medialibPageSize = 100
+streamChunkSize = 200
+searchResultLimit = 500
+configGroupSize = 4
+playlistDisplayRange = 10
+playlistEntriesDisplayed = 50
+playlistIndexLeafSize = 100
+playlistIndexTopBuckets = 100
+
+volumeSteps = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+indexLetters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+inlineVolume = False
+inlineConfig = False
+inlinePlaylist = True
+
+prefetchInfos = True
+stateMaxAge = 300.0
+trackInfoCacheSize = 2000
+renderedCacheSize = 8 * 1024 * 1024
+snapshotCacheSize = 2 * 1024 * 1024
+connectTimeout = 0.5
+daemonStatusMaxAge = 5.0
+
+statsLogSize = 64 * 1024
+statsAlbumsKept = 500
+statsMenuSize = 20
+
+settingNames = ["medialibPageSize", "streamChunkSize", "searchResultLimit",
+                "configGroupSize", "playlistDisplayRange", "playlistEntriesDisplayed",
+                "playlistIndexLeafSize", "playlistIndexTopBuckets", "volumeSteps",
+                "indexLetters", "inlineVolume", "inlineConfig", "inlinePlaylist",
+                "prefetchInfos", "stateMaxAge", "trackInfoCacheSize", "renderedCacheSize",
+                "snapshotCacheSize", "connectTimeout", "daemonStatusMaxAge",
+                "statsLogSize", "statsAlbumsKept", "statsMenuSize"]
+defaultSettings = dict((name, globals()[name]) for name in settingNames)
+settings = dict(defaultSettings)
+settingsErrors = []
+
+#===============================================================================
+#Helper Methods    
+def clientDirectory():
+    return os.path.join(xmmsclient.userconfdir_get(), "clients/openboxMenu")
+
+def cacheDirectory():
+    directory = os.path.join(clientDirectory(), "cache")
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return directory
+
+class ReplacedFile():
+    """Temporary file which replaces path once the with block completes.
+    
+    Readers never see a half written file. If the block raises, the
+    temporary file is removed and path is left as it was.
+    """
+    
+    def __init__(self, path, mode="w"):
+        self.path = path
+        self.temporaryPath = path + ".{0}".format(os.getpid())
+        self.mode = mode
+    
+    def __enter__(self):
+        self.file = open(self.temporaryPath, self.mode)
+        return self.file
+    
+    def __exit__(self, errorType, error, traceback):
+        self.file.close()
+        if errorType is None:
+            os.rename(self.temporaryPath, self.path)
+        else:
+            try:
+                os.remove(self.temporaryPath)
+            except OSError:
+                pass
+        return False
+
+cachedValues = dict()
+
+def loadCached(name, signature, build):
+    """Returns build(), reusing an earlier result built for the same signature.
+    
+    Results are kept in memory and pickled into the cache directory.
+    """
+    import cPickle
+    
+    cached = cachedValues.get(name)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    
+    cachePath = os.path.join(cacheDirectory(), name + ".pickle")
+    try:
+        with open(cachePath, "rb") as cacheFile:
+            cached = cPickle.load(cacheFile)
+    except (IOError, EOFError, cPickle.UnpicklingError):
+        cached = None
+    
+    if cached is None or cached[0] != signature:
+        storeCached(name, signature, build())
+        return cachedValues[name][1]
+    
+    cachedValues[name] = cached
+    return cached[1]
+
+def storeCached(name, signature, value):
+    """Replaces the result of loadCached, e.g. after it was changed in place."""
+    import cPickle
+    
+    cached = cachedValues[name] = (signature, value)
+    
+    cachePath = os.path.join(cacheDirectory(), name + ".pickle")
+    with ReplacedFile(cachePath, "wb") as cacheFile:
+        cPickle.dump(cached, cacheFile, cPickle.HIGHEST_PROTOCOL)
+
+def loadParsed(path, parse):
+    """Returns parse(path), reusing an earlier result while the file is unchanged.
+    
+    Raises OSError if the file does not exist.
+    """
+    signature = (path, os.stat(path).st_mtime, parse.__name__)
+    return loadCached(os.path.basename(path), signature, lambda: parse(path))
+
+booleanSettingValues = {"1": True, "yes": True, "true": True, "on": True,
+                        "0": False, "no": False, "false": False, "off": False}
+
+def parseSettings(path):
+    """Returns the settings of a settings file, converted to the types of the defaults.
+    
+    Returns the settings and the errors of the lines that were left out, a
+    bad line keeps the default of its setting only.
+    """
+    import ConfigParser
+    
+    config = ConfigParser.RawConfigParser()
+    config.optionxform = str
+    errors = []
+    try:
+        config.read(path)
+    except ConfigParser.ParsingError:
+        errors.append("unreadable lines")
+    
+    parsed = dict()
+    for section in config.sections():
+        for name, value in config.items(section):
+            # a file with unreadable lines is left with unjoined values
+            if isinstance(value, list):
+                value = "\n".join(value)
+            if name not in defaultSettings:
+                errors.append("unknown setting " + name)
+                continue
+            
+            default = defaultSettings[name]
+            try:
+                if isinstance(default, bool):
+                    parsed[name] = booleanSettingValues[value.strip().lower()]
+                elif isinstance(default, int):
+                    parsed[name] = int(value)
+                elif isinstance(default, float):
+                    parsed[name] = float(value)
+                elif isinstance(default, list):
+                    parsed[name] = [int(step) for step in value.replace(",", " ").split()]
+                else:
+                    parsed[name] = value.strip()
+            except (KeyError, ValueError):
+                errors.append("bad value for {0}: {1}".format(name, value.strip()))
+    return parsed, errors
+
+def loadSettings():
+    """Applies menuSettings.ini over the default settings.
+    
+    The parsed file is cached until it changes, a missing file leaves the
+    defaults. The errors of a broken file are kept in settingsErrors.
+    """
+    global settings, settingsErrors
+    
+    settings = dict(defaultSettings)
+    try:
+        parsed, settingsErrors = loadParsed(
+            os.path.join(clientDirectory(), "menuSettings.ini"), parseSettings)
+        settings.update(parsed)
+    except OSError:
+        settingsErrors = []
+    globals().update(settings)
+
+# the string caches below live as long as the menu server, they are
+# dropped whenever they hold more strings than this
+cachedStringsLimit = 50000
+
+quotedParameters = dict()
+
+def quoteParameter(parameter):
+    parameter = str(parameter)
+    quoted = quotedParameters.get(parameter)
+    if quoted is None:
+        if len(quotedParameters) > cachedStringsLimit:
+            quotedParameters.clear()
+        quoted = quotedParameters[parameter] = quoteattr(parameter)
+    return quoted
+
+class BatchSeparator(object):
+    """Stands for argvBatchSeparator in the parameters of a command.
+    
+    A parameter made of nothing but "+" is written with one "+" more, so it
+    can not be taken for the separator.
+    """
+    
+    __slots__ = ()
+
+batchSeparator = BatchSeparator()
+
+quotedArguments = dict()
+
+def quoteArgument(parameter):
+    quoted = quotedArguments.get(parameter)
+    if quoted is not None:
+        return quoted
+    
+    if parameter is batchSeparator:
+        argument = argvBatchSeparator
+    else:
+        argument = str(parameter)
+        if argument and not argument.strip(argvBatchSeparator):
+            argument = argvBatchSeparator + argument
+    
+    if len(quotedArguments) > cachedStringsLimit:
+        quotedArguments.clear()
+    quoted = quotedArguments[parameter] = quoteattr(argument)
+    return quoted
+
+def unescapeArgument(argument):
+    if len(argument) > 1 and not argument.strip(argvBatchSeparator):
+        return argument[1:]
+    return argument
+
+def createCommand(parameters):   
+    return menuScript + ' ' + ' '.join([quoteArgument(i) for i in parameters])
+
+class CommandTemplate(object):
+    """Command line whose leading parameters are quoted once for all rows."""
+    
+    __slots__ = ("prefix",)
+    
+    def __init__(self, parameters):
+        self.prefix = createCommand(parameters)
+    
+    def command(self, *parameters):
+        if not parameters:
+            return self.prefix
+        return self.prefix + ' ' + ' '.join([quoteArgument(i) for i in parameters])
+
+commandTemplates = dict()
+
+def commandTemplate(*parameters):
+    template = commandTemplates.get(parameters)
+    if template is None:
+        template = commandTemplates[parameters] = CommandTemplate(parameters)
+    return template
+
+def batchCommand(*commands):
+    """Returns the parameters running several action commands in one process."""
+    parameters = list(commands[0])
+    for command in commands[1:]:
+        parameters.append(batchSeparator)
+        parameters.extend(command)
+    return parameters
+
+def splitCommands(argv):
+    """Returns the argv of every command of a batch, with its parameters unescaped."""
+    commands = [argv[:1]]
+    for argument in argv[1:]:
+        if argument == argvBatchSeparator:
+            commands.append(argv[:1])
+        else:
+            commands[-1].append(unescapeArgument(argument))
+    return commands
+
+def streamRows(fetch, start=0, count=None):
+    """Yields up to count rows of fetch(start, count), fetched streamChunkSize at a time."""
+    end = None
+    if count is not None:
+        end = start + count
+    
+    while end is None or start < end:
+        size = streamChunkSize
+        if end is not None:
+            size = min(size, end - start)
+        
+        rows = fetch(start, size)
+        for row in rows:
+            yield row
+        
+        if len(rows) < size:
+            return
+        start += size
+
+def idListCollection(ids):
+    collection = xc.IDList()
+    for id in ids:
+        collection.ids.append(id)
+    return collection
+
+def medialibInfos(ids, fields):
+    """Fetches fields of several medialib entries with one query, keyed by id."""
+    if len(ids) == 0:
+        return dict()
+    
+    results = xmms.coll_query_infos(idListCollection(set(ids)), ["id"] + fields)
+    return dict((result["id"], result) for result in results)
+
+def humanReadableSize(size):
+    for x in ['bytes','KB','MB','GB']:
+        if size < 1024.0:
+            return "%3.2f%s" % (size, x)
+        size /= 1024.0
+        
+def humanReadableDuration(milliseconds):
+    seconds = int(milliseconds) / 1000
+    minutes, seconds = divmod(seconds, 60)
+    if minutes > 0:
+        return "{0}m {1}s".format(minutes, seconds)
+    else:
+        return "{0}s".format(seconds)
+
+encodedStrings = dict()
+
+def readInterned(dictionary, key):
+    """Like readString, for artists and albums repeated over many rows.
+    
+    Every distinct value is encoded once, to an interned string.
+    """
+    value = dictionary.get(key)
+    if value is None:
+        return ""
+    
+    encoded = encodedStrings.get(value)
+    if encoded is None:
+        if len(encodedStrings) > cachedStringsLimit:
+            encodedStrings.clear()
+        encoded = encodedStrings[value] = intern(readString(dictionary, key))
+    return encoded
+
+def readString(dictionary, key, default=""):
+    if key in dictionary:
+        value = dictionary[key]
+        if isinstance(value, basestring):
+            return value.encode('utf8')
+        else:
+            return str(value)
+    else:
+        return default
+
+
+
+#===============================================================================
+#Medialib Index
+digitIndexKey = "0-9"
+otherIndexKey = "#"
+
+def indexKey(artist):
+    """Returns the AlphabetIndex bucket an artist name belongs to."""
+    if not artist:
+        return None
+
+    if not isinstance(artist, unicode):
+        artist = str(artist).decode('utf8', 'replace')
+
+    initial = artist[0]
+    if initial < u'\x80':
+        if initial.isalpha():
+            return str(initial.upper())
+        if initial.isdigit():
+            return digitIndexKey
+        return otherIndexKey
+
+    if initial.isalpha():
+        return initial.upper().encode('utf8')
+    return otherIndexKey
+
+def indexKeyOrder(key):
+    if len(key) == 1 and key.isalpha():
+        return (0, key)
+    if key == digitIndexKey:
+        return (1, key)
+    if key == otherIndexKey:
+        return (3, key)
+    return (2, key)
+
+def indexCollection(key):
+    """Returns a collection containing at least all tracks of an index bucket.
+    
+    The "#" bucket has no matching pattern, its entries have to be filtered
+    by indexKey() on the client side.
+    """
+    if key == digitIndexKey:
+        return xc.Union(*[xc.Match(field="artist", value=str(digit)+"*")
+                          for digit in range(10)])
+    if key == otherIndexKey:
+        return xc.Has(xc.Universe(), field="artist")
+        
+    return xc.Match(field="artist", value=str(key)+"*")
+
+#===============================================================================
+#Medialib Access
+class MedialibQueries():
+    """Answers the medialib index menus with queries to the daemon."""
+    
+    def indexCounts(self):
+        results = xmms.coll_query_infos(xc.Universe(), ["artist"])
+
+        counts = dict()
+        for result in results:
+            key = indexKey(result.get('artist'))
+            if key is not None:
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def artists(self, key, start, count):
+        """Returns up to count distinct artists of an index bucket, from start on."""
+        if key == otherIndexKey:
+            results = xmms.coll_query_infos(indexCollection(key), ["artist"],
+                                            order=["artist"], groupby=["artist"])
+            results = [result for result in results
+                       if indexKey(result.get('artist')) == key]
+            return results[start:start + count]
+        
+        results = xmms.coll_query_infos(indexCollection(key), ["artist"],
+                                        start=start, leng=count,
+                                        order=["artist"], groupby=["artist"])
+        return [result for result in results
+                if indexKey(result.get('artist')) == key]
+
+    def albums(self, artist, start, count):
+        """Returns up to count distinct albums of an artist, from start on."""
+        match = xc.Intersection(xc.Match(field="artist", value=artist),
+                                xc.Has(xc.Universe(), field="album"))
+        return xmms.coll_query_infos(match, ["date", "album"],
+                                     start=start, leng=count,
+                                     order=["date", "album"], groupby=["album"])
+
+    def tracks(self, artist, album, start, count):
+        match = xc.Intersection(xc.Match(field="artist", value=artist), 
+                                xc.Match(field="album", value=album))
+        return xmms.coll_query_infos(match, ["tracknr", "title", "id"],
+                                     start=start, leng=count, order=["id"])
+
+    def search(self, query, count):
+        """Returns up to count tracks with query in their artist, album or title."""
+        pattern = "*" + query + "*"
+        match = xc.Union(*[xc.Match(field=field, value=pattern)
+                           for field in ["artist", "album", "title"]])
+        return xmms.coll_query_infos(match, ["id", "artist", "album", "tracknr", "title"],
+                                     leng=count, order=["artist", "album", "tracknr"])
+
+def medialibStamp():
+    """Returns a change stamp of the local daemon's medialib database.
+    
+    The stamp is taken from the database file, so reading it costs no daemon
+    round-trip. None is returned if the database is not on this machine, or
+    if XMMS_PATH points to another daemon than the local one.
+    """
+    path = os.getenv("XMMS_PATH")
+    if path is not None and path != defaultDaemonPath():
+        return None
+    
+    for fileName in ["medialib.db", "medialib.s4"]:
+        path = os.path.join(xmmsclient.userconfdir_get(), fileName)
+        try:
+            status = os.stat(path)
+        except OSError:
+            continue
+        return "{0}:{1}:{2}".format(fileName, status.st_mtime, status.st_size)
+    return None
+
+def medialibVersionPath():
+    return os.path.join(cacheDirectory(), "medialibVersion.json")
+
+def readMedialibVersion():
+    """Returns the stamp and version the local index was last brought to."""
+    try:
+        with open(medialibVersionPath()) as versionFile:
+            stamp, version = json.load(versionFile)
+    except (IOError, ValueError, TypeError):
+        return None, None
+    return stamp, version
+
+def medialibVersion():
+    """Returns the version of the local index's content, None if it may be outdated.
+    
+    The version only changes when tracks of the index change, not with every
+    write the daemon makes to its database.
+    """
+    stamp = medialibStamp()
+    if stamp is None:
+        return None
+    
+    storedStamp, version = readMedialibVersion()
+    if storedStamp != stamp:
+        return None
+    return version
+
+class MedialibChanges():
+    """Ids of the medialib entries changed since they were last taken.
+    
+    The menu server collects them from daemon broadcasts, so its index does
+    not have to be compared with the whole medialib when the stamp changes.
+    """
+    
+    def __init__(self):
+        self.connection = None
+        self.changed = set()
+        self.removed = set()
+    
+    def subscribe(self, connection):
+        self.reset()
+        
+        client = connection.xmms
+        try:
+            client.broadcast_medialib_entry_changed(self.entryChanged)
+            client.broadcast_medialib_entry_added(self.entryChanged)
+            client.broadcast_medialib_entry_removed(self.entryRemoved)
+        except AttributeError:
+            return
+        self.connection = connection
+    
+    def reset(self):
+        self.connection = None
+        self.changed.clear()
+        self.removed.clear()
+    
+    def entryChanged(self, result):
+        if not result.iserror():
+            self.changed.add(result.value())
+            self.removed.discard(result.value())
+        return True
+    
+    def entryRemoved(self, result):
+        if not result.iserror():
+            self.removed.add(result.value())
+            self.changed.discard(result.value())
+        return True
+    
+    def take(self):
+        changed, removed = list(self.changed), list(self.removed)
+        self.changed.clear()
+        self.removed.clear()
+        return changed, removed
+
+medialibChanges = MedialibChanges()
+
+def searchText(row):
+    """Returns the lowercase artist, album and title of a track, one per line."""
+    return u"\n".join([row.get(field) or u"" for field in ["artist", "album", "title"]]).lower()
+
+def trigrams(text):
+    result = set()
+    for line in text.split(u"\n"):
+        result.update([line[i:i + 3] for i in xrange(len(line) - 2)])
+    return result
+
+def rowDictionary(cursor, row):
+    result = dict()
+    for column, value in zip(cursor.description, row):
+        if value is not None:
+            result[column[0]] = value
+    return result
+
+class MedialibCache():
+    """Local index of artist -> album -> track ids.
+    
+    The index is kept in a sqlite database in the client directory. When the
+    medialib stamp changes, only the tracks whose lmod changed are fetched
+    again, the menu server fetches the tracks the daemon broadcast as changed
+    instead. The trigram index used by search() is updated on first use, for
+    the changed tracks only.
+    """
+    
+    fields = ["id", "artist", "album", "date", "tracknr", "title", "lmod"]
+    schema = "3"
+    
+    def __init__(self, stamp):
+        directory = clientDirectory()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        
+        self.db = sqlite3.connect(os.path.join(directory, "medialib.sqlite"))
+        self.db.row_factory = rowDictionary
+        self.db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+        if self.storedValue('schema') != self.schema:
+            with self.db:
+                self.db.executescript("""
+                    DELETE FROM info;
+                    DROP TABLE IF EXISTS tracks;
+                    DROP TABLE IF EXISTS searchTexts;
+                    DROP TABLE IF EXISTS trigrams;
+                    DROP TABLE IF EXISTS changedTracks;
+                    """)
+                self.db.execute("INSERT INTO info VALUES ('schema', ?)", [self.schema])
+        
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS tracks (id INTEGER PRIMARY KEY,
+                indexKey TEXT, artist TEXT, album TEXT, date TEXT,
+                tracknr INTEGER, title TEXT, lmod INTEGER);
+            CREATE INDEX IF NOT EXISTS tracksByIndexKey ON tracks (indexKey);
+            CREATE INDEX IF NOT EXISTS tracksByArtist
+                ON tracks (artist COLLATE NOCASE, album COLLATE NOCASE);
+            CREATE TABLE IF NOT EXISTS searchTexts (id INTEGER PRIMARY KEY, text TEXT);
+            CREATE TABLE IF NOT EXISTS trigrams (trigram TEXT PRIMARY KEY, ids BLOB);
+            CREATE TABLE IF NOT EXISTS changedTracks (id INTEGER PRIMARY KEY);
+            """)
+        
+        self.watchedBy = None
+        self.savedVersion = readMedialibVersion()
+        self.update(stamp)
+
+    def update(self, stamp):
+        """Brings the index up to the medialib of the given stamp."""
+        changes = medialibChanges
+        if changes.connection is not None and self.watchedBy is changes.connection:
+            changed, removed = changes.take()
+            self.store(self.changedRows(self.fetchRows(changed)), removed, stamp)
+        elif self.storedValue('stamp') != stamp:
+            changes.take()
+            self.synchronize(stamp)
+        self.watchedBy = changes.connection
+        self.stamp = stamp
+        
+        version = (stamp, self.storedValue('version'))
+        if self.savedVersion != version:
+            with ReplacedFile(medialibVersionPath()) as versionFile:
+                json.dump(version, versionFile)
+            self.savedVersion = version
+
+    def storedValue(self, key):
+        row = self.db.execute("SELECT value FROM info WHERE key = ?", [key]).fetchone()
+        if row is None:
+            return None
+        return row['value']
+
+    def row(self, result):
+        key = indexKey(result.get('artist'))
+        if key is not None:
+            key = key.decode('utf8')
+        return [result.get(field) for field in self.fields] + [key]
+
+    def fetchRows(self, ids):
+        if not ids:
+            return list()
+        return [self.row(result)
+                for result in xmms.coll_query_infos(idListCollection(ids), self.fields)]
+
+    def changedRows(self, rows):
+        """Returns the rows which differ from the stored ones."""
+        stored = dict()
+        for first in range(0, len(rows), 500):
+            chunk = [row[0] for row in rows[first:first + 500]]
+            for storedRow in self.db.execute("SELECT {0}, indexKey FROM tracks WHERE id IN ({1})"
+                                             .format(", ".join(self.fields),
+                                                     ", ".join("?" * len(chunk))), chunk):
+                stored[storedRow['id']] = ([storedRow.get(field) for field in self.fields]
+                                           + [storedRow.get('indexKey')])
+        return [row for row in rows if stored.get(row[0]) != row]
+
+    def synchronize(self, stamp):
+        """Fetches the tracks whose lmod differs from the stored one."""
+        stored = dict((row['id'], row.get('lmod'))
+                      for row in self.db.execute("SELECT id, lmod FROM tracks"))
+        if not stored:
+            rows = [self.row(result)
+                    for result in xmms.coll_query_infos(xc.Universe(), self.fields)]
+            self.store(rows, [], stamp)
+            return
+        
+        missing = object()
+        changed = list()
+        for result in xmms.coll_query_infos(xc.Universe(), ["id", "lmod"]):
+            if stored.pop(result["id"], missing) != result.get("lmod"):
+                changed.append(result["id"])
+        
+        self.store(self.fetchRows(changed), list(stored), stamp)
+
+    def store(self, rows, removedIds, stamp):
+        """Writes the changed rows, drops the removed tracks and records the stamp."""
+        changedIds = [(row[0],) for row in rows] + [(id,) for id in removedIds]
+        if not changedIds and self.storedValue('stamp') == stamp:
+            return
+        
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO tracks "
+                                "(id, artist, album, date, tracknr, title, lmod, indexKey) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.executemany("DELETE FROM tracks WHERE id = ?",
+                                ((id,) for id in removedIds))
+            self.db.executemany("INSERT OR IGNORE INTO changedTracks VALUES (?)", changedIds)
+            self.db.execute("INSERT OR REPLACE INTO info VALUES ('stamp', ?)", [stamp])
+            if changedIds or self.storedValue('version') is None:
+                self.db.execute("INSERT OR REPLACE INTO info VALUES ('version', ?)",
+                                [repr(time.time())])
+
+    def indexCounts(self):
+        rows = self.db.execute("SELECT indexKey, COUNT(*) AS count FROM tracks "
+                               "WHERE indexKey IS NOT NULL GROUP BY indexKey")
+        return dict((row['indexKey'].encode('utf8'), row['count']) for row in rows)
+
+    def artists(self, key, start, count):
+        return self.db.execute("SELECT DISTINCT artist FROM tracks WHERE indexKey = ? "
+                               "ORDER BY artist COLLATE NOCASE LIMIT ? OFFSET ?",
+                               [key.decode('utf8'), count, start]).fetchall()
+
+    def albums(self, artist, start, count):
+        return self.db.execute("SELECT MIN(date) AS date, album FROM tracks "
+                               "WHERE artist = ? COLLATE NOCASE AND album IS NOT NULL "
+                               "GROUP BY album ORDER BY date, album LIMIT ? OFFSET ?",
+                               [artist.decode('utf8'), count, start]).fetchall()
+
+    def tracks(self, artist, album, start, count):
+        return self.db.execute("SELECT tracknr, title, id FROM tracks "
+                               "WHERE artist = ? COLLATE NOCASE "
+                               "AND album = ? COLLATE NOCASE ORDER BY id LIMIT ? OFFSET ?",
+                               [artist.decode('utf8'), album.decode('utf8'),
+                                count, start]).fetchall()
+
+    def postings(self, trigramList):
+        """Returns the ids of the tracks containing each of the trigrams."""
+        from array import array
+        
+        postings = dict()
+        for first in range(0, len(trigramList), 500):
+            chunk = trigramList[first:first + 500]
+            rows = self.db.execute("SELECT trigram, ids FROM trigrams WHERE trigram IN ({0})"
+                                   .format(", ".join("?" * len(chunk))), chunk)
+            for row in rows:
+                ids = array('i')
+                ids.fromstring(str(row['ids']))
+                postings[row['trigram']] = set(ids)
+        return postings
+
+    def updateSearch(self):
+        from array import array
+        
+        if self.db.execute("SELECT id FROM changedTracks LIMIT 1").fetchone() is None:
+            return
+        
+        texts = dict((row['id'], row['text'])
+                     for row in self.db.execute("SELECT searchTexts.id AS id, text "
+                                                "FROM changedTracks JOIN searchTexts "
+                                                "ON changedTracks.id = searchTexts.id"))
+        
+        removed = list()
+        added = list()
+        for row in self.db.execute("SELECT tracks.id AS id, artist, album, title "
+                                   "FROM changedTracks JOIN tracks "
+                                   "ON changedTracks.id = tracks.id"):
+            text = searchText(row)
+            storedText = texts.pop(row['id'], None)
+            if storedText != text:
+                added.append((row['id'], text))
+                if storedText is not None:
+                    removed.append((row['id'], storedText))
+        removed.extend(texts.items())
+        
+        removedTrigrams = [(id, trigrams(text)) for id, text in removed]
+        addedTrigrams = [(id, trigrams(text)) for id, text in added]
+        
+        changed = set()
+        for id, trackTrigrams in removedTrigrams + addedTrigrams:
+            changed.update(trackTrigrams)
+        
+        postings = self.postings(list(changed))
+        for trigram in changed:
+            postings.setdefault(trigram, set())
+        
+        for id, trackTrigrams in removedTrigrams:
+            for trigram in trackTrigrams:
+                postings[trigram].discard(id)
+        for id, trackTrigrams in addedTrigrams:
+            for trigram in trackTrigrams:
+                postings[trigram].add(id)
+        
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO trigrams VALUES (?, ?)",
+                                ((trigram, sqlite3.Binary(array('i', sorted(ids)).tostring()))
+                                 for trigram, ids in postings.iteritems() if ids))
+            self.db.executemany("DELETE FROM trigrams WHERE trigram = ?",
+                                ((trigram,) for trigram, ids in postings.iteritems() if not ids))
+            self.db.executemany("DELETE FROM searchTexts WHERE id = ?",
+                                ((id,) for id, text in removed))
+            self.db.executemany("INSERT INTO searchTexts VALUES (?, ?)", added)
+            self.db.execute("DELETE FROM changedTracks")
+
+    def search(self, query, count):
+        """Returns up to count tracks with query in their artist, album or title."""
+        self.updateSearch()
+        
+        text = query.decode('utf8').lower()
+        queryTrigrams = list(trigrams(text))
+        
+        select = ("SELECT tracks.id AS id, artist, album, tracknr, title, text "
+                  "FROM tracks JOIN searchTexts ON tracks.id = searchTexts.id ")
+        order = " ORDER BY artist COLLATE NOCASE, album COLLATE NOCASE, tracknr"
+        if queryTrigrams:
+            postings = self.postings(queryTrigrams)
+            if len(postings) < len(queryTrigrams):
+                return list()
+            
+            candidates = sorted(postings.values(), key=len)
+            ids = candidates[0].intersection(*candidates[1:])
+            
+            self.db.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (id INTEGER PRIMARY KEY)")
+            self.db.execute("DELETE FROM candidates")
+            self.db.executemany("INSERT INTO candidates VALUES (?)", ((id,) for id in ids))
+            rows = self.db.execute(select + "JOIN candidates ON tracks.id = candidates.id" + order)
+        else:
+            rows = self.db.execute(select + order)
+        
+        results = list()
+        for row in rows:
+            if text in row.pop('text'):
+                results.append(row)
+                if len(results) == count:
+                    break
+        return results
+
+def openMedialib(current=None):
+    """Returns the local medialib index, or direct queries if it is not usable.
+    
+    An index opened for an earlier request is reused while it is up to date.
+    """
+    stamp = medialibStamp()
+    if stamp is None:
+        return MedialibQueries()
+    
+    try:
+        if isinstance(current, MedialibCache):
+            current.update(stamp)
+            return current
+        return MedialibCache(stamp)
+    except (sqlite3.Error, OSError):
+        return MedialibQueries()
+
+#===============================================================================
+#Rendered Menus
+renderedCommands = ["alphabetIndexArtists", "indexAlbum", "indexTracks", "searchResults"]
+
+def isRenderedCommand(argv):
+    """Returns True for menus which only change when the medialib changes."""
+    if len(argv) < 2:
+        return False
+    return argv[1] in renderedCommands or argv[1:3] == ["menu", "index-alphabet"]
+
+def renderedDirectory():
+    directory = os.path.join(cacheDirectory(), "menus")
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    return directory
+
+def renderedPath(argv):
+    """Returns the cache file of the menu for argv, None if it can not be cached."""
+    import hashlib
+    
+    version = medialibVersion()
+    if version is None:
+        return None
+    
+    key = "\0".join([menuScript, version, repr(sorted(settings.items()))] + argv[1:])
+    return os.path.join(renderedDirectory(), hashlib.sha1(key).hexdigest() + ".xml")
+
+def writeRenderedMenu(argv):
+    """Writes the menu rendered earlier for argv, returns False if there is none."""
+    import mmap
+    
+    path = renderedPath(argv)
+    if path is None:
+        return False
+    
+    try:
+        renderedFile = open(path, "rb")
+        os.utime(path, None)
+    except EnvironmentError:
+        return False
+    
+    with renderedFile:
+        mapped = mmap.mmap(renderedFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if isinstance(sys.stdout, file):
+                sys.stdout.write(mapped)
+            else:
+                sys.stdout.write(mapped[:])
+        finally:
+            mapped.close()
+    
+    return True
+
+class RenderedOutput():
+    """Writes the menu to the stream and into the cache file."""
+    
+    def __init__(self, stream, renderedFile):
+        self.stream = stream
+        self.renderedFile = renderedFile
+    
+    def write(self, data):
+        self.stream.write(data)
+        self.renderedFile.write(data)
+
+def renderMenu(argv, entries):
+    """Writes the menu and stores its XML for later requests with the same argv."""
+    path = renderedPath(argv)
+    if path is None:
+        Container(entries).write()
+        return
+    
+    with ReplacedFile(path, "wb") as renderedFile:
+        Container(entries).write(RenderedOutput(sys.stdout, renderedFile))
+    
+    evictFiles(renderedDirectory(), renderedCacheSize)
+
+def evictFiles(directory, cacheSize):
+    """Removes the least recently used files until the directory fits cacheSize."""
+    files = list()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            status = os.stat(path)
+        except OSError:
+            continue
+        files.append((status.st_mtime, status.st_size, path))
+    
+    totalSize = sum(size for modified, size, path in files)
+    for modified, size, path in sorted(files):
+        if totalSize <= cacheSize:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        totalSize -= size
+
+def clearRendered():
+    directory = renderedDirectory()
+    for name in os.listdir(directory):
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+#===============================================================================
+#Snapshots
+# the last output of every menu, written instead when the daemon is down,
+# the rendered Medialib menus serve as their own snapshots
+def snapshotPath(argv):
+    import hashlib
+    
+    directory = os.path.join(cacheDirectory(), "snapshots")
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    
+    key = "\0".join([menuScript] + argv[1:])
+    return os.path.join(directory, hashlib.sha1(key).hexdigest() + ".xml")
+
+def recordSnapshot(argv, render):
+    """Runs render(argv) and keeps the menu it writes as the snapshot for argv."""
+    path = snapshotPath(argv)
+    # only a new snapshot can make the directory grow past its size
+    isNew = not os.path.exists(path)
+    
+    stdout = sys.stdout
+    with ReplacedFile(path, "wb") as snapshotFile:
+        sys.stdout = RenderedOutput(stdout, snapshotFile)
+        try:
+            render(argv)
+        finally:
+            sys.stdout = stdout
+    
+    if isNew:
+        evictFiles(os.path.dirname(path), snapshotCacheSize)
+
+def writeSnapshot(argv, error):
+    """Writes the snapshot for argv marked as stale, returns False if there is none."""
+    if isActionCommand(argv):
+        return False
+    
+    if isRenderedCommand(argv):
+        path = renderedPath(splitCommands(argv)[0])
+        if path is None:
+            return False
+    else:
+        path = snapshotPath(argv)
+    
+    try:
+        with open(path, "rb") as snapshotFile:
+            snapshot = snapshotFile.read()
+        modified = os.stat(path).st_mtime
+    except EnvironmentError:
+        return False
+    
+    header = "<openbox_pipe_menu>\n"
+    if header not in snapshot:
+        return False
+    
+    stale = ["Offline: " + str(error),
+             time.strftime("Menu of %H:%M, %d %b", time.localtime(modified))]
+    marks = "".join("<separator label={0}/>\n".format(quoteattr(label)) for label in stale)
+    sys.stdout.write(snapshot.replace(header, header + marks, 1))
+    return True
+
+def writeConnectionFailed(argv, error):
+    if not writeSnapshot(argv, error):
+        Container(Separator("Connection failed: " + str(error))).write()
+
+#===============================================================================
+#Track Info Cache
+class TrackInfoCache():
+    """Infos of recently listed tracks, keyed by medialib id and modification time.
+    
+    The least recently used infos are dropped above trackInfoCacheSize.
+    Reading an info only writes its use time if it is older than
+    usedPrecision seconds, so a hover does not cost a write transaction.
+    """
+    
+    usedPrecision = 3600
+    
+    def __init__(self):
+        self.db = sqlite3.connect(os.path.join(cacheDirectory(), "trackInfo.sqlite"))
+        self.db.execute("CREATE TABLE IF NOT EXISTS infos (id INTEGER PRIMARY KEY, "
+                        "lmod INTEGER, info TEXT, used REAL)")
+    
+    def get(self, id, lmod):
+        row = self.db.execute("SELECT info, used FROM infos WHERE id = ? AND lmod = ?",
+                              [id, lmod]).fetchone()
+        if row is None:
+            return None
+        
+        now = time.time()
+        if now - row[1] > self.usedPrecision:
+            with self.db:
+                self.db.execute("UPDATE infos SET used = ? WHERE id = ?", [now, id])
+        return json.loads(row[0])
+    
+    def store(self, infos):
+        rows = list()
+        for info in infos:
+            if info.get("lmod") is not None:
+                info = dict((key, value) for key, value in info.iteritems() if value is not None)
+                rows.append((info["id"], info["lmod"], json.dumps(info), time.time()))
+        
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO infos VALUES (?, ?, ?, ?)", rows)
+            self.db.execute("DELETE FROM infos WHERE id NOT IN "
+                            "(SELECT id FROM infos ORDER BY used DESC LIMIT ?)",
+                            [trackInfoCacheSize])
+
+trackInfoCache = None
+
+def openTrackInfoCache():
+    global trackInfoCache
+    if trackInfoCache is None:
+        trackInfoCache = TrackInfoCache()
+    return trackInfoCache
+
+def prefetchTrackInfos(ids):
+    """Fetches the infos of the tracks with one query and keeps them for TrackInfo."""
+    if not prefetchInfos:
+        return medialibInfos(ids, ["artist", "album", "title"])
+    
+    infos = medialibInfos(ids, TrackInfo.fields)
+    try:
+        openTrackInfoCache().store(infos.values())
+    except sqlite3.Error:
+        pass
+    return infos
+
+def infoParameters(id, lmod=None):
+    if lmod is None:
+        return [str(id)]
+    return [str(id), str(lmod)]
+
+def infoCommand(id, lmod=None):
+    return ["track", "info"] + infoParameters(id, lmod)
+
+#===============================================================================
+#Album Stats
+# every added or played album is appended to a log, which is folded into the
+# rankings of the Recent and Top albums menus once it is read or grows too large
+def statsLogPath():
+    return os.path.join(cacheDirectory(), "albumStats.log")
+
+def rankingsPath():
+    return os.path.join(cacheDirectory(), "albumRankings.json")
+
+def recordAlbum(artist, album):
+    """Appends a use of the album to the stats log."""
+    if not album:
+        return
+    
+    with open(statsLogPath(), "a") as log:
+        log.write(json.dumps([round(time.time(), 3), artist, album]) + "\n")
+        size = log.tell()
+    
+    if size > statsLogSize:
+        compactStats()
+
+def readRankings():
+    try:
+        with open(rankingsPath()) as rankingsFile:
+            return json.load(rankingsFile)
+    except (IOError, ValueError):
+        return {"albums": [], "recent": [], "top": []}
+
+def compactStats():
+    """Folds the stats log into the rankings and starts a new log."""
+    logPath = statsLogPath()
+    compactedPath = logPath + ".{0}".format(os.getpid())
+    try:
+        os.rename(logPath, compactedPath)
+    except OSError:
+        return
+    
+    albums = dict()
+    for artist, album, count, used in readRankings()["albums"]:
+        albums[(artist, album)] = [count, used]
+    
+    with open(compactedPath) as log:
+        for line in log:
+            try:
+                used, artist, album = json.loads(line)
+            except (ValueError, TypeError):
+                continue
+            stats = albums.setdefault((artist, album), [0, 0])
+            stats[0] += 1
+            stats[1] = max(stats[1], used)
+    
+    recent = sorted(albums, key=lambda key: albums[key][1], reverse=True)
+    top = sorted(albums, key=lambda key: albums[key], reverse=True)
+    kept = set(recent[:statsAlbumsKept]) | set(top[:statsAlbumsKept])
+    
+    rankings = {"albums": [[artist, album] + albums[(artist, album)]
+                           for artist, album in kept],
+                "recent": [list(key) for key in recent[:statsMenuSize]],
+                "top": [list(key) for key in top[:statsMenuSize]]}
+    
+    with ReplacedFile(rankingsPath()) as rankingsFile:
+        json.dump(rankings, rankingsFile)
+    os.remove(compactedPath)
+
+#===============================================================================
+#Writers
+class AlphabetIndex():
+    def write(self, output):
+        counts = dict.fromkeys(indexLetters, 0)
+        counts.update(medialib.indexCounts())
+
+        for key in sorted(counts, key=indexKeyOrder):
+            if counts[key] == 0 and indexKeyOrder(key)[0] != 0:
+                continue
+            
+            groupLabel = "{0} ({1})".format(key, str(counts[key]))
+            PipeMenu(groupLabel, ["alphabetIndexArtists", key] ).write(output)
+        
+        Separator().write(output)
+        Button("Refresh", ["refresh"] ).write(output)
+
+class ArtistsList():
+    def __init__(self, key, start=0, pageSize=None):
+        self.key = str(key)
+        self.start = start
+        self.pageSize = pageSize or medialibPageSize
+            
+    def write(self, output):   
+        results = medialib.artists(self.key, self.start, self.pageSize + 1)
+        
+        for result in results[:self.pageSize]:
+            artist = readString(result, 'artist')
+            PipeMenu(artist, ["indexAlbum", artist] ).write(output)
+        
+        if len(results) > self.pageSize:
+            nextStart = self.start + self.pageSize
+            PipeMenu("... next {0}".format(self.pageSize),
+                     ["alphabetIndexArtists", self.key, str(nextStart)] ).write(output)
+
+class AlbumList():
+    def __init__(self, artist, start=0, pageSize=None):
+        self.artist = artist
+        self.start = start
+        self.pageSize = pageSize or medialibPageSize
+
+    def write(self, output):          
+        fetch = lambda start, count: medialib.albums(self.artist, start, count)
+        
+        written = 0
+        for result in streamRows(fetch, self.start, self.pageSize + 1):
+            written += 1
+            if written > self.pageSize:
+                break
+            
+            if result.get("album") is not None:
+                album = readString(result, 'album')
+                label = "[" + readString(result, 'date') + "] " + album
+                writePipeMenu(output, label, ["indexTracks", self.artist, album])
+        
+        if written > self.pageSize:
+            nextStart = self.start + self.pageSize
+            PipeMenu("... next {0}".format(self.pageSize),
+                     ["indexAlbum", self.artist, str(nextStart)] ).write(output)
+
+class TrackList():
+    def __init__(self, artist, album):
+        self.artist = artist
+        self.album = album
+    
+    def fetch(self, start, count):
+        results = medialib.tracks(self.artist, self.album, start, count)
+        
+        infos = dict()
+        if prefetchInfos:
+            infos = prefetchTrackInfos([result["id"] for result in results])
+        for result in results:
+            result["lmod"] = infos.get(result["id"], {}).get("lmod")
+        return results
+    
+    def write(self, output):
+        for result in streamRows(self.fetch):
+            id = str(result["id"])
+            title = readString(result, 'title')
+            trackNumber = readString(result, 'tracknr')
+            
+            TrackMenu("xmms-track-" + id, id, trackNumber + " - " + title,
+                      result["lmod"], self.artist, self.album).write(output)
+
+        Separator().write(output)
+        Button("Add to Playlist", ["album", "add", self.artist, self.album] ).write(output)
+        Button("Add whole Artist", ["artist", "add", self.artist] ).write(output)
+        
+        key = indexKey(self.artist)
+        if key is not None:
+            Button("Add whole Letter " + key, ["letter", "add", key] ).write(output)
+
+class RankedAlbums():
+    """Albums of the "recent" or "top" ranking, without asking the daemon."""
+    
+    def __init__(self, ranking):
+        self.ranking = ranking
+    
+    def write(self, output):
+        if os.path.exists(statsLogPath()):
+            compactStats()
+        
+        albums = readRankings()[self.ranking]
+        if not albums:
+            Label("No albums played yet").write(output)
+            return
+        
+        for artist, album in albums:
+            artist = artist.encode('utf8')
+            album = album.encode('utf8')
+            writePipeMenu(output, artist + " - " + album, ["indexTracks", artist, album])
+
+class SearchResults():
+    """Artists, albums and tracks matching the query, a page at a time."""
+    
+    def __init__(self, query, start=0, pageSize=None):
+        self.query = query
+        self.start = start
+        self.pageSize = pageSize or medialibPageSize
+    
+    def entries(self, results):
+        needle = self.query.decode('utf8').lower()
+        
+        def contains(result, field):
+            return needle in (result.get(field) or u"").lower()
+        
+        artists = list()
+        albums = list()
+        tracks = list()
+        for result in results:
+            artist = readInterned(result, 'artist')
+            album = readInterned(result, 'album')
+            
+            if contains(result, 'artist') and artist not in artists:
+                artists.append(artist)
+            if contains(result, 'album') and (artist, album) not in albums:
+                albums.append((artist, album))
+            if contains(result, 'title'):
+                tracks.append(result)
+        
+        entries = list()
+        for artist in artists:
+            entries.append(("Artists", PipeMenu(artist, ["indexAlbum", artist])))
+        
+        for artist, album in albums:
+            entries.append(("Albums", PipeMenu(artist + " - " + album,
+                                               ["indexTracks", artist, album])))
+        
+        for result in tracks:
+            id = str(result["id"])
+            artist = readInterned(result, 'artist')
+            label = artist + " - " + readString(result, 'title')
+            entries.append(("Tracks", TrackMenu("xmms-search-" + id, id, label, None, artist,
+                                                readInterned(result, 'album'))))
+        return entries
+    
+    def write(self, output):
+        results = medialib.search(self.query, searchResultLimit)
+        entries = self.entries(results)
+        
+        if not entries:
+            Separator("No matches for " + self.query).write(output)
+            return
+        
+        group = None
+        for entryGroup, entry in entries[self.start:self.start + self.pageSize]:
+            if entryGroup != group:
+                group = entryGroup
+                Separator(group).write(output)
+            entry.write(output)
+        
+        if len(entries) > self.start + self.pageSize:
+            nextStart = self.start + self.pageSize
+            PipeMenu("... next {0}".format(self.pageSize),
+                     ["searchResults", self.query, str(nextStart)] ).write(output)
+        
+        if len(results) == searchResultLimit:
+            Separator("Only the first {0} tracks are shown".format(searchResultLimit)).write(output)
+
+class TrackInfo():
+    fields = ["artist", "album", "title", "duration", "size", "bitrate", "url",
+              "picture_front", "lmod"]
+    
+    def __init__(self, id, lmod=None):
+        self.id = int(id)
+        self.lmod = lmod
+    
+    def info(self):
+        """Returns the prefetched info if the track is unchanged since, else asks the daemon."""
+        if self.lmod is not None:
+            try:
+                minfo = openTrackInfoCache().get(self.id, self.lmod)
+            except sqlite3.Error:
+                minfo = None
+            if minfo is not None:
+                return minfo
+        
+        return xmms.medialib_get_info(self.id)
+                                     
+    def write(self, output):
+        minfo = self.info()
+
+        Label("Artist \t: " + readString(minfo, 'artist')).write(output)
+        Label("Album \t: " + readString(minfo, 'album')).write(output)
+        Label("Title \t: " + readString(minfo, 'title')).write(output)
+        Label("Duration \t: " + humanReadableDuration(minfo['duration'])).write(output)
+        Separator().write(output)     
+        Label("Size \t\t: " + humanReadableSize(minfo["size"])).write(output)
+        Label("Bitrate \t: " + readString(minfo, 'bitrate')).write(output)
+        
+        from urllib import unquote_plus
+        url = unquote_plus(readString(minfo, 'url'))
+        filename = url.split('/')[-1]
+
+        Label("Url \t: " + url).write(output)
+        Label("File \t: " + filename).write(output)
+        
+        if 'picture_front' in minfo:
+            picture = os.path.join(xmmsclient.userconfdir_get(), "bindata",
+                                   readString(minfo, 'picture_front'))
+            Label("Cover \t: " + picture).write(output)
+
+class ConfigMenu():
+    def write(self, output):
+        Separator("Presets:").write(output)
+        ConfigPresets().write(output)
+        Separator().write(output)
+        ConfigView().write(output)
+
+def parsePresets(path):
+    """Returns the presets of a preset file as a list of (name, items) pairs."""
+    import ConfigParser
+    
+    config = ConfigParser.RawConfigParser()
+    try:
+        config.read(path)
+    except ConfigParser.ParsingError:
+        raise ValueError('Preset file parsing error')
+    
+    return [(preset, config.items(preset)) for preset in config.sections()]
+
+class ConfigPresets():
+    def __init__(self):
+        configPath = os.path.join(clientDirectory(), "configPresets.ini")
+    
+        self.errorMessage = None
+        self.presets = list()
+    
+        try:
+            self.presets = loadParsed(configPath, parsePresets)
+        except OSError:
+            self.errorMessage = 'Preset file not found'
+        except ValueError as error:
+            self.errorMessage = str(error)
+        
+    def load(self, name):    
+        currentValues = xmms.config_list_values()
+        
+        changes = list()
+        for key, value in dict(self.presets)[name]:
+            if currentValues.get(key) != value:
+                changes.append(("config_set_value", [key, value]))
+        
+        gather(*changes)
+        
+    def write(self, output):
+        if self.errorMessage != None:
+            Separator(self.errorMessage).write(output)
+            return
+        
+        currentValues = xmms.config_list_values()
+        
+        for preset, items in self.presets:
+            isActive = True
+            
+            for key, value in items:
+                if value != currentValues.get(key):
+                    isActive = False
+                    break
+            
+            Button(preset, ["preset-load", preset], isActive).write(output)
+        
+def buildConfigTree(keys):
+    """Returns a {prefix: (child prefixes, keys)} map of the config key space.
+    
+    Every dotted namespace is a prefix. Numbered keys sharing a stem, like
+    equalizer.gain00 to equalizer.gain31, get a "stem*" prefix of their own.
+    """
+    tree = {"": (set(), list())}
+    
+    for key in sorted(keys):
+        prefix = ""
+        for segment in key.split('.')[:-1]:
+            child = prefix + "." + segment if prefix else segment
+            tree[prefix][0].add(child)
+            tree.setdefault(child, (set(), list()))
+            prefix = child
+        tree[prefix][1].append(key)
+    
+    for prefix in list(tree):
+        children, leaves = tree[prefix]
+        
+        stems = dict()
+        for key in leaves:
+            stem = re.match(r"(.*?)\d*$", key).group(1)
+            if stem != key:
+                stems.setdefault(stem, list()).append(key)
+        
+        for stem, grouped in stems.items():
+            if len(grouped) < configGroupSize:
+                continue
+            
+            group = stem + "*"
+            tree[group] = (list(), grouped)
+            children.add(group)
+            leaves[:] = [key for key in leaves if key not in grouped]
+    
+    return dict((prefix, (sorted(children), leaves))
+                for prefix, (children, leaves) in tree.items())
+
+class ConfigView():
+    def __init__(self, configKey = None):
+        self.configKey = configKey
+
+    def write(self, output):      
+        resultData = dict((key.encode('utf8'), value)
+                          for key, value in xmms.config_list_values().items())
+        
+        # the grouping depends on configGroupSize as much as on the keys
+        tree = loadCached("configTree", (configGroupSize, hash(frozenset(resultData))),
+                          lambda: buildConfigTree(resultData))
+        children, keys = tree.get(self.configKey or "", ([], []))
+        
+        entries = list()
+        for child in children:
+            label = child
+            if self.configKey is not None:
+                label = child[len(self.configKey):].lstrip('.')
+            entries.append(PipeMenu(label, ["menu", "config-view", child] ))
+        
+        displayKeyChars = 0
+        for entry in keys:
+            displayKeyChars = max(displayKeyChars, len(entry))
+        
+        for entry in keys:
+            padding = displayKeyChars - len(entry) + 1
+            entries.append(Label(entry + (" " * padding) + "\t" + readString(resultData, entry)))
+        
+        if self.configKey is None:
+            Menu("view all", "configView", entries).write(output)
+        else:
+            for entry in entries:
+                entry.write(output)
+                
+class VolumeMenu():
+    def write(self, output):
+        if fetchState("playback_status")["playback_status"] == xmmsclient.PLAYBACK_STATUS_STOP:
+            Separator("Cannot set Volume on Stopped stream.").write(output)
+            return
+        
+        currentVolumes = fetchState("playback_volume_get")["playback_volume_get"]
+        masterVolume = currentVolumes['master']
+
+        volumeHasBeenSelected = False
+        
+        for id, val in enumerate(volumeSteps):
+            isSelectedVolume = False
+        
+            if masterVolume <= val and not volumeHasBeenSelected:
+                isSelectedVolume = True
+                volumeHasBeenSelected = True
+
+            Button(str(val)+"%", ["volume", val], isSelectedVolume).write(output)
+
+class PlaylistMenu():
+    requests = ["playlist_list", "playlist_current_active", "playlist_current_pos",
+                "playback_current_id", "playlist_list_entries"]
+    
+    def __init__(self, state=None):
+        self.state = state or fetchState(*self.requests)
+    
+    def write(self, output):
+        playlists = self.state["playlist_list"]
+        activePlaylist = self.state["playlist_current_active"]
+
+        playlistMenu = list()
+        playlistMenu.append(Button("New Playlist", ["createPlaylist"] ))
+        playlistMenu.append(Separator())
+        
+        for playlist in playlists:
+            if playlist.startswith('_'):
+                continue
+            
+            loadButton = Button("load", ["loadPlaylist", playlist] )
+            playButton = Button("load and play", batchCommand(["loadPlaylist", playlist],
+                                                              ["jump", "0"], ["play"]) )
+            deleteButton = Button("delete", ["removePlaylist", playlist] )
+            
+            playlistMenu.append(Menu("xmms-playlist-"+playlist, playlist, [loadButton, playButton, Separator(), deleteButton], playlist == activePlaylist))
+
+        Menu("xmms-playlists", "Playlist: {0}".format(activePlaylist), playlistMenu).write(output)
+        PipeMenu("Go to position", ["menu", "playlist-index"] ).write(output)
+        Separator().write(output)
+        
+        selectedIndex = currentPosition()
+        
+        if selectedIndex is not None:
+            PlaylistEntriesMenu(selectedIndex, "both", playlistDisplayRange).write(output)
+        else:
+            PlaylistEntriesMenu(0, "top", playlistDisplayRange).write(output)
+
+class PlaylistEntriesMenu():
+    def __init__(self, pos, expandDirection, maxDisplayed = None):
+        maxDisplayed = maxDisplayed or playlistEntriesDisplayed
+        
+        self.expandBottom = False
+        self.expandTop = False
+        
+        if expandDirection == "bottom":
+            if pos - maxDisplayed > 0:
+                self.expandBottom = True
+                
+            first, last = max(pos - maxDisplayed, 0), pos
+             
+        if expandDirection == "top":
+            first, last = pos, pos + maxDisplayed
+            
+        if expandDirection == "both":
+            halfDisplayed = maxDisplayed/2
+            
+            if pos - halfDisplayed > 0:
+                self.expandBottom = True
+                
+            first, last = max(pos - halfDisplayed, 0), pos + halfDisplayed
+        
+        # the entries and the current track in one round-trip
+        state = fetchState("playlist_list_entries", "playback_current_id")
+        self.activeId = state["playback_current_id"]
+        
+        # one entry more than displayed tells if there is anything after the window
+        self.entryIds = playlistWindow(first, last + 1)
+        if len(self.entryIds) > last - first and expandDirection != "bottom":
+            self.expandTop = True
+            
+        self.first = first
+        self.positions = range(first, min(last, first + len(self.entryIds)))
+                
+    def rows(self, results):
+        """Returns position, medialib id, label and info of all entries."""
+        rows = list()
+        for id in self.positions:
+            medialibId = self.entryIds[id - self.first]
+            result = results.get(medialibId, {})
+            
+            label = "{0}|  {1} - {2} - {3}".format(str(id).zfill(3),
+                                                   readInterned(result, 'artist'),
+                                                   readInterned(result, 'album'),
+                                                   readString(result, 'title'))
+            rows.append((id, medialibId, label, result))
+        return rows
+    
+    def write(self, output):
+        if len(self.positions) == 0 and self.first == 0:
+            Label('Playlist is Empty').write(output)
+            return
+            
+        if self.expandBottom:
+            PipeMenu("... before", ["menu", "playlist-entries", str(self.positions[0]), "bottom"] ).write(output)
+
+        results = prefetchTrackInfos(self.entryIds)
+        
+        jump = commandTemplate("jump")
+        move = commandTemplate("playlist-entry", "move")
+        remove = commandTemplate("playlist-entry", "remove")
+        info = commandTemplate("track", "info")
+        
+        for id, medialibId, entryLabel, result in self.rows(results):
+            position = str(id)
+            entryId = str(medialibId)
+            artist = readInterned(result, 'artist')
+            album = readInterned(result, 'album')
+            
+            output.write("<menu id={0} label={1}>\n".format(
+                quoteattr("xmms-activePlaylist-" + entryId),
+                quoteattr(marker(medialibId == self.activeId) + entryLabel)))
+            
+            writeCommandButton(output, quoteParameter("jump"),
+                               jump.command(position, artist, album))
+            output.write("<separator/>\n")
+            
+            output.write("<menu id={0} label={1}>\n".format(quoteattr("xmms-move-" + entryId),
+                                                           quoteParameter("move")))
+            writeCommandButton(output, quoteParameter("move first"),
+                               move.command(position, "0"))
+            writeCommandButton(output, quoteParameter("move first and play"),
+                               move.command(position, "0", batchSeparator, "jump", "0",
+                                            artist, album, batchSeparator, "play"))
+            for offset in [-5, -1, +1, +5]:
+                writeCommandButton(output, quoteParameter("move {0:+d}".format(offset)),
+                                   move.command(position, str(id + offset)))
+            writeCommandButton(output, quoteParameter("move last"),
+                               move.command(position, "last"))
+            output.write("</menu>\n")
+            
+            output.write("<separator/>\n")
+            writeCommandPipeMenu(output, quoteParameter("Infos"),
+                                 info.command(*infoParameters(medialibId, result.get("lmod"))))
+            output.write("<separator/>\n")
+            writeCommandButton(output, quoteParameter("delete"), remove.command(position))
+            output.write("</menu>\n")
+                
+        if self.expandTop:
+            PipeMenu("... after", ["menu", "playlist-entries", str(self.positions[-1]+1), "top"]).write(output)
+        
+
+playlistIndexLevelsKept = 100
+
+class PlaylistIndexMenu():
+    """Buckets of playlist positions, each opening ten times smaller buckets.
+    
+    The buckets are labelled with the titles of their first and last entry.
+    The top level has at most playlistIndexTopBuckets buckets, the smallest
+    buckets of playlistIndexLeafSize positions open their entries.
+    """
+    
+    def __init__(self, start=0, size=None):
+        self.start = start
+        self.size = size
+    
+    def bucketSize(self, length):
+        if self.size is not None:
+            return max(self.size / 10, playlistIndexLeafSize)
+        
+        size = playlistIndexLeafSize
+        while length > size * playlistIndexTopBuckets:
+            size *= 10
+        return size
+    
+    def summaries(self, ids):
+        """Returns the first and last title of every bucket, from one medialib query."""
+        bucketSize = self.bucketSize(len(ids))
+        
+        buckets = list()
+        for first in range(0, len(ids), bucketSize):
+            last = min(first + bucketSize, len(ids)) - 1
+            buckets.append((first, last))
+        
+        infos = medialibInfos([ids[position] for bucket in buckets for position in bucket],
+                              ["artist", "title"])
+        
+        def title(position):
+            info = infos.get(ids[position], {})
+            return readString(info, 'artist') + " - " + readString(info, 'title')
+        
+        return bucketSize, [(first, last, title(first), title(last))
+                            for first, last in buckets]
+    
+    def write(self, output):
+        end = None
+        if self.size is not None:
+            end = self.start + self.size
+        ids = playlistWindow(self.start, end)
+        
+        if len(ids) == 0:
+            Label('Playlist is Empty').write(output)
+            return
+        
+        # the buckets of every opened level, until the playlist changes
+        signature = playerState.signature("playlist_list_entries")
+        levels = loadCached("playlistIndex", signature, dict)
+        level = (self.start, self.size)
+        if level not in levels:
+            if len(levels) >= playlistIndexLevelsKept:
+                levels.clear()
+            levels[level] = self.summaries(ids)
+            storeCached("playlistIndex", signature, levels)
+        bucketSize, summaries = levels[level]
+        
+        for first, last, firstTitle, lastTitle in summaries:
+            position = self.start + first
+            label = "{0}-{1}|  {2}  ...  {3}".format(position, self.start + last,
+                                                     firstTitle, lastTitle)
+            
+            if bucketSize > playlistIndexLeafSize:
+                PipeMenu(label, ["menu", "playlist-index", str(position),
+                                 str(bucketSize)] ).write(output)
+            else:
+                PipeMenu(label, ["menu", "playlist-entries", str(position), "top",
+                                 str(bucketSize)] ).write(output)
+
+#===============================================================================
+#Main Menu
+class MainMenu():
+    def write(self, output):
+        requests = ["playback_status"]
+        if inlinePlaylist:
+            requests.extend(PlaylistMenu.requests)
+        state = fetchState(*requests)
+        
+        for error in settingsErrors:
+            Separator("menuSettings.ini: " + error).write(output)
+        if settingsErrors:
+            Separator().write(output)
+        
+        if state["playback_status"] == xmmsclient.PLAYBACK_STATUS_PLAY:
+            Button("⧐ Pause", ["pause"] ).write(output)
+        else:
+            Button("⧐ Play", ["play"] ).write(output)
+
+        Button("≫ next", ["next"] ).write(output)
+        Button("≪ prev", ["prev"] ).write(output)
+        Separator().write(output)
+        
+        if inlineVolume:
+            Menu("xmms-volume", "Volume", [VolumeMenu()]).write(output)
+        else:
+            PipeMenu("Volume", ["menu", "volume"] ).write(output)
+        Separator().write(output)
+        
+        PipeMenu("Medialib", ["menu", "index-alphabet"] ).write(output)
+        PipeMenu("Recent", ["menu", "recent-albums"] ).write(output)
+        PipeMenu("Top albums", ["menu", "top-albums"] ).write(output)
+        Button("Search ...", ["search"] ).write(output)
+        
+        query = savedSearch()
+        if query:
+            PipeMenu("Results for " + query, ["searchResults", query] ).write(output)
+        
+        if inlineConfig:
+            Menu("xmms-config", "Config", [ConfigMenu()]).write(output)
+        else:
+            PipeMenu("Config", ["menu", "config"] ).write(output)
+        Separator().write(output)
+        
+        if inlinePlaylist:
+            PlaylistMenu(state).write(output)
+        else:
+            PipeMenu("Playlist", ["menu", "playlist"] ).write(output)
+
+#===============================================================================
+#Commands
+def createPlaylist():
+    import Tkinter
+    import tkSimpleDialog
+    
+    root = Tkinter.Tk()
+    root.withdraw()
+
+    name = tkSimpleDialog.askstring("New Playlist Name",
+                                    "Enter a new Playlist Name")
+    if name is not None:
+        xmms.playlist_create(name)
+
+def searchPath():
+    return os.path.join(clientDirectory(), "searchQuery")
+
+def savedSearch():
+    """Returns the last query entered with the search prompt, or None."""
+    try:
+        with open(searchPath()) as searchFile:
+            return searchFile.read().strip()
+    except IOError:
+        return None
+
+def search():
+    import Tkinter
+    import tkSimpleDialog
+    
+    root = Tkinter.Tk()
+    root.withdraw()
+
+    query = tkSimpleDialog.askstring("Search", "Search artists, albums and titles",
+                                     initialvalue=savedSearch() or "")
+    if query is None:
+        return
+    if isinstance(query, unicode):
+        query = query.encode('utf8')
+    
+    if not os.path.isdir(clientDirectory()):
+        os.makedirs(clientDirectory())
+    with open(searchPath(), "w") as searchFile:
+        searchFile.write(query.strip())
+
+def playCommand(argv):
+    send("playback_start")
+
+def pauseCommand(argv):
+    send("playback_pause")
+
+def nextCommand(argv):
+    send("playlist_set_next_rel", 1)
+    send("playback_tickle")
+
+def prevCommand(argv):
+    send("playlist_set_next_rel", -1)
+    send("playback_tickle")
+
+def jumpCommand(argv):
+    position = int(argv[2])
+    send("playlist_set_next", position)
+    send("playback_tickle")
+    
+    if len(argv) == 5:
+        recordAlbum(argv[3], argv[4])
+
+def trackCommand(argv):
+    subCommand = str(argv[2])
+    trackId = int(argv[3])
+    
+    if subCommand == "add":
+        send("playlist_insert_id", 0, trackId)
+        
+        if len(argv) == 6:
+            recordAlbum(argv[4], argv[5])
+
+def albumCommand(argv):
+    subCommand = str(argv[2])
+    artistName = str(argv[3])
+    albumName = str(argv[4])
+
+    if subCommand == "add":
+        match = xc.Intersection(xc.Match(field="artist", value=artistName),
+                                xc.Match(field="album", value=albumName))
+
+        send("playlist_add_collection", match, ["tracknr"])
+        recordAlbum(artistName, albumName)
+
+def artistCommand(argv):
+    subCommand = str(argv[2])
+    artistName = str(argv[3])
+
+    if subCommand == "add":
+        match = xc.Match(field="artist", value=artistName)
+        send("playlist_add_collection", match, ["date", "album", "tracknr"])
+
+def letterCommand(argv):
+    subCommand = str(argv[2])
+    key = str(argv[3])
+
+    if subCommand == "add":
+        collection = indexCollection(key)
+        if key == otherIndexKey:
+            results = xmms.coll_query_infos(collection, ["id", "artist"])
+            collection = idListCollection([result["id"] for result in results
+                                           if indexKey(result.get('artist')) == key])
+        
+        send("playlist_add_collection", collection, ["artist", "date", "album", "tracknr"])
+
+def playlistEntryCommand(argv):
+    subCommand = str(argv[2])
+    entryIndex = int(argv[3])
+    
+    if subCommand == "move":
+        if argv[4] == "last":
+            newIndex = len(xmms.playlist_list_entries()) - 1
+        else:
+            newIndex = int(argv[4])
+        send("playlist_move", entryIndex, newIndex)
+    
+    if subCommand == "remove":
+        send("playlist_remove_entry", entryIndex)
+
+def loadPlaylistCommand(argv):
+    playlistName = str(argv[2])
+    send("playlist_load", playlistName)
+
+def removePlaylistCommand(argv):
+    playlistName = str(argv[2])
+    send("playlist_remove", playlistName)
+
+def presetLoadCommand(argv):
+    presetName = str(argv[2])
+    ConfigPresets().load(presetName)
+
+def volumeCommand(argv):
+    volume = int(argv[2])
+    send("playback_volume_set", "master", volume)
+
+def refreshCommand(argv):
+    """Drops the rendered menus and the local medialib index."""
+    global medialib
+    
+    clearRendered()
+    try:
+        os.remove(os.path.join(clientDirectory(), "medialib.sqlite"))
+    except OSError:
+        pass
+    medialib = None
+
+actionCommands = {
+    "play": playCommand,
+    "pause": pauseCommand,
+    "next": nextCommand,
+    "prev": prevCommand,
+    "jump": jumpCommand,
+    "track": trackCommand,
+    "album": albumCommand,
+    "artist": artistCommand,
+    "letter": letterCommand,
+    "playlist-entry": playlistEntryCommand,
+    "createPlaylist": lambda argv: createPlaylist(),
+    "search": lambda argv: search(),
+    "loadPlaylist": loadPlaylistCommand,
+    "removePlaylist": removePlaylistCommand,
+    "preset-load": presetLoadCommand,
+    "volume": volumeCommand,
+    "refresh": refreshCommand,
+}
+
+def isActionCommand(argv):
+    """Returns True for commands which only talk to the daemon and print nothing.
+    
+    A batch of commands is an action command if all of its commands are.
+    """
+    for command in splitCommands(argv):
+        if len(command) < 2 or command[1] not in actionCommands:
+            return False
+        if command[1] == "track" and command[2] == "info":
+            return False
+    return True
+
+#===============================================================================
+#Main
+def connect():
+    connection = Connection("xmms2-OpenboxMenu")
+    connection.connect(os.getenv("XMMS_PATH"))
+    return connection
+
+def connectWithin(argv):
+    """Connects to xmms2d, giving up after connectTimeout seconds.
+    
+    xmmsclient waits for the answer to its hello without a timeout, so a
+    forked watchdog writes the failure menu for argv and ends this process
+    if a hung daemon keeps it waiting.
+    """
+    import signal
+    
+    sys.stdout.flush()
+    parent = os.getpid()
+    watchdog = os.fork()
+    if watchdog == 0:
+        try:
+            time.sleep(connectTimeout)
+            os.kill(parent, signal.SIGKILL)
+            
+            error = "xmms2d did not answer within {0}s".format(connectTimeout)
+            saveDaemonStatus(daemonSignature(daemonPath()), error)
+            importMenuModules()
+            writeConnectionFailed(argv, error)
+            sys.stdout.flush()
+        finally:
+            os._exit(1)
+    
+    try:
+        return connect()
+    finally:
+        os.kill(watchdog, signal.SIGKILL)
+        os.waitpid(watchdog, 0)
+
+def run(argv, start=None):
+    """Runs a request, profiling it if asked to by argument or environment."""
+    global profiler
+    
+    if argvProfileFlag in argv[1:2]:
+        argv = argv[:1] + argv[2:]
+        profiler = Profiler(argv, start)
+    elif os.getenv("XMMS2_OPENBOX_PROFILE"):
+        profiler = Profiler(argv, start)
+    
+    try:
+        if isActionCommand(argv) or isRenderedCommand(argv):
+            dispatch(argv)
+        else:
+            recordSnapshot(argv, dispatch)
+    finally:
+        if profiler is not None:
+            profiler.save()
+            profiler = None
+
+def dispatch(argv):
+    """Writes the menu or runs the command selected by the arguments."""
+    if isActionCommand(argv):
+        try:
+            for command in splitCommands(argv):
+                actionCommands[command[1]](command)
+        finally:
+            flush()
+            playerState.clear()
+        return
+    
+    loadSettings()
+    argv = splitCommands(argv)[0]
+    
+    # tracks the menu server was told about by broadcasts are not in the
+    # stamp, the index has to take them before its menus can be reused
+    pendingChanges = medialibChanges.changed or medialibChanges.removed
+    if isRenderedCommand(argv) and not pendingChanges and writeRenderedMenu(argv):
+        return
+    
+    importMenuModules()
+    
+    # only the medialib menus read the index, the others do not wait for it
+    # to be brought up to date
+    if isRenderedCommand(argv):
+        global medialib
+        medialib = openMedialib(medialib)
+        
+        # the index is up to date now, its menus rendered earlier may still be current
+        if writeRenderedMenu(argv):
+            return
+    
+    paramterCount = len(argv)
+    
+    if paramterCount == 1:
+        Container(MainMenu()).write()
+    elif paramterCount >= 2:
+        command = argv[1]
+        
+        if command == "menu":
+            menuName = str(argv[2])
+            
+            if menuName == "playlist-entries":
+                pos = int(argv[3])
+                direction = str(argv[4])
+                maxDisplayed = None
+                if paramterCount == 6:
+                    maxDisplayed = int(argv[5])
+                
+                Container(PlaylistEntriesMenu(pos, direction, maxDisplayed)).write()
+            
+            if menuName == "playlist-index":
+                start = 0
+                size = None
+                if paramterCount == 5:
+                    start = int(argv[3])
+                    size = int(argv[4])
+                
+                Container(PlaylistIndexMenu(start, size)).write()
+                
+            if menuName == "volume":
+                Container(VolumeMenu()).write()
+            
+            if menuName == "playlist":
+                Container(PlaylistMenu()).write()
+            
+            if menuName == "config":
+                Container(ConfigMenu()).write()
+            
+            if menuName == "config-view":
+                configKey = None
+                if paramterCount == 4:
+                    configKey = str(argv[3])
+                
+                Container(ConfigView(configKey)).write()
+                
+            if menuName == "index-alphabet":
+                renderMenu(argv, AlphabetIndex())
+            
+            if menuName == "recent-albums":
+                Container(RankedAlbums("recent")).write()
+            
+            if menuName == "top-albums":
+                Container(RankedAlbums("top")).write()
+        
+        if command == "track":
+            trackId = int(argv[3])
+            lmod = None
+            if paramterCount == 5:
+                lmod = int(argv[4])
+            
+            Container(TrackInfo(trackId, lmod)).write()
+          
+        if command == "alphabetIndexArtists":
+            index = str(argv[2])
+            start = 0
+            if paramterCount == 4:
+                start = int(argv[3])
+            
+            renderMenu(argv, ArtistsList(unescape(index), start))
+            
+        if command == "indexAlbum":
+            artist = str(argv[2])
+            start = 0
+            if paramterCount == 4:
+                start = int(argv[3])
+            
+            renderMenu(argv, AlbumList(unescape(artist), start))
+        
+        if command == "indexTracks":
+            artist = str(argv[2])
+            album = str(argv[3])
+            renderMenu(argv, TrackList(unescape(artist), unescape(album)))
+        
+        if command == "searchResults":
+            query = str(argv[2])
+            start = 0
+            if paramterCount == 4:
+                start = int(argv[3])
+            
+            renderMenu(argv, SearchResults(unescape(query), start))
+
+#===============================================================================
+#Menu Server
+# seconds a client may keep the server waiting while it sends or reads
+clientTimeout = 0.5
+
+class ServerOutput():
+    """Collects everything the writers print while a request is handled."""
+    
+    def __init__(self):
+        self.chunks = list()
+    
+    def write(self, data):
+        self.chunks.append(data)
+    
+    def flush(self):
+        pass
+    
+    def getvalue(self):
+        return "".join(self.chunks)
+
+def handleRequest(client):
+    global xmms
+    
+    chunks = list()
+    while True:
+        data = client.recv(4096)
+        if not data:
+            break
+        chunks.append(data)
+    
+    argv = [menuScript] + [argument.encode('utf8')
+                         for argument in json.loads("".join(chunks))]
+    
+    output = ServerOutput()
+    sys.stdout = output
+    try:
+        if xmms is None:
+            probeDaemon()
+            xmms = connectServer()
+        run(argv)
+        status = "ok"
+    except IOError as error:
+        xmms = None
+        playerState.clear()
+        medialibChanges.reset()
+        output.chunks = list()
+        writeConnectionFailed(argv, error)
+        status = "ok"
+    except Exception as error:
+        status = "error " + str(error)
+    finally:
+        sys.stdout = sys.__stdout__
+    
+    client.sendall(status + "\n" + output.getvalue())
+
+def connectServer():
+    connection = connect()
+    playerState.subscribe(connection)
+    medialibChanges.subscribe(connection)
+    return connection
+
+def runServer():
+    """Answers forwarded menu requests over one warm xmms2 connection."""
+    global xmms
+    
+    import select
+    import signal
+    importMenuModules()
+    
+    address = serverAddress()
+    if os.path.exists(address):
+        os.remove(address)
+    
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(address)
+    server.listen(8)
+    
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    try:
+        xmms = connectServer()
+    except IOError:
+        xmms = None
+    
+    try:
+        while True:
+            readers = [server]
+            writers = list()
+            if xmms is not None:
+                readers.append(xmms)
+                if xmms.wantsOutput():
+                    writers.append(xmms)
+            
+            readable, writable, _ = select.select(readers, writers, [])
+            
+            if xmms in writable:
+                xmms.xmms.ioout()
+            if xmms in readable:
+                xmms.xmms.ioin()
+            
+            if xmms is not None and not xmms.isConnected:
+                xmms = None
+                playerState.clear()
+                medialibChanges.reset()
+            
+            if server in readable:
+                client, _ = server.accept()
+                client.settimeout(clientTimeout)
+                try:
+                    handleRequest(client)
+                except (socket.error, ValueError):
+                    pass
+                finally:
+                    client.close()
+    finally:
+        server.close()
+        os.remove(address)
+
+medialib = None
+
+def main(argv, start=None):
+    """Handles the arguments of xmms2-OpenboxMenu.py, argv[0] being the script."""
+    global xmms, menuScript
+    
+    menuScript = argv[0]
+    
+    if argvServerFlag in argv[1:2]:
+        runServer()
+        sys.exit(0)
+    
+    if argvProfileSummaryFlag in argv[1:2]:
+        printProfileSummary()
+        sys.exit(0)
+    
+    loadSettings()
+    
+    # a rendered menu that is still current is written without connecting
+    if isRenderedCommand(argv) and writeRenderedMenu(argv):
+        sys.exit(0)
+    
+    try:
+        probeDaemon()
+        xmms = connectWithin(argv)
+        
+    except IOError as detail:
+        importMenuModules()
+        writeConnectionFailed(argv, detail)
+        sys.exit(1)
+    
+    run(argv, start)
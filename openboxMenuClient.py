@@ -0,0 +1,137 @@
+#-*- coding:utf-8 -*-
+
+# Copyright (c) 2012 Eli
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and
+# associated documentation files (the "Software"), to deal in the Software without restriction, 
+# including without limitation the rights to use, copy, modify, merge, publish, distribute,
+# sublicense, and/or sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING
+# BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND 
+# NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+# The part of the menu started for every request before the menu module, it
+# forwards the request to a running menu server.
+
+import os
+import sys
+
+import json
+import socket
+
+#===============================================================================
+#Menu Server Client
+argvServerFlag = "--server"
+argvProfileFlag = "--profile"
+argvProfileSummaryFlag = "--profile-summary"
+argvBatchSeparator = "+"
+
+# commands asking with a dialog, never handled by the menu server
+promptCommands = ["createPlaylist", "search"]
+
+# seconds the menu server may take to answer, a stuck server must not block
+# the pipe menu
+serverTimeout = 2.0
+
+def runtimeDirectory():
+    """Returns a directory only this user can write to.
+    
+    Without XDG_RUNTIME_DIR a private directory is created in /tmp. Raises
+    IOError if the directory belongs to someone else or is open to others,
+    since another user could then answer in place of the menu server.
+    """
+    import stat
+    
+    directory = os.getenv("XDG_RUNTIME_DIR")
+    if not directory:
+        directory = "/tmp/xmms2-OpenboxMenu-{0}".format(os.getuid())
+        try:
+            os.mkdir(directory, 0700)
+        except OSError:
+            pass
+    
+    status = os.lstat(directory)
+    if (not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid()
+        or status.st_mode & 0077):
+        raise IOError("{0} is not private to this user".format(directory))
+    return directory
+
+def runtimePath(extension):
+    return os.path.join(runtimeDirectory(),
+                        "xmms2-OpenboxMenu-{0}.{1}".format(os.getuid(), extension))
+
+def serverAddress():
+    return runtimePath("sock")
+
+def forwardToServer(arguments):
+    """Lets a running menu server handle the arguments and prints its output.
+    
+    Returns False if no server is listening, in which case the request has
+    to be handled in this process.
+    """
+    try:
+        address = serverAddress()
+        if os.lstat(address).st_uid != os.getuid():
+            return False
+    except (IOError, OSError):
+        return False
+    
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(serverTimeout)
+    try:
+        client.connect(address)
+    except socket.error:
+        client.close()
+        return False
+    
+    chunks = list()
+    timedOut = False
+    try:
+        client.sendall(json.dumps(arguments))
+        client.shutdown(socket.SHUT_WR)
+        while True:
+            data = client.recv(65536)
+            if not data:
+                break
+            chunks.append(data)
+    except socket.timeout:
+        timedOut = True
+    except socket.error as error:
+        chunks = ["error " + str(error) + "\n"]
+    finally:
+        client.close()
+    
+    if timedOut:
+        import openboxMenu
+        # a menu is written in this process instead, an action the server
+        # may already have run is not run twice
+        if not openboxMenu.isActionCommand([sys.argv[0]] + arguments):
+            return False
+        chunks = ["error no answer within {0}s\n".format(serverTimeout)]
+    
+    status, _, output = "".join(chunks).partition("\n")
+    if status == "ok":
+        sys.stdout.write(output)
+    else:
+        import openboxMenu
+        openboxMenu.importMenuModules()
+        openboxMenu.Container(openboxMenu.Separator("Menu server failed: " + status[6:])).write()
+    return True
+
+def forwardRequest(argv):
+    """Forwards the request to the menu server if it can handle it.
+    
+    Returns False if the request has to be handled in this process.
+    """
+    if argv[1:2] in [[argvServerFlag], [argvProfileSummaryFlag]]:
+        return False
+    if set(promptCommands) & set(argv[1:]):
+        return False
+    return forwardToServer(argv[1:])